@@ -0,0 +1,84 @@
+"""
+Time YTDLHelper.extract_info with the yt-dlp worker pool replaced by a stub.
+
+The stub returns a recorded info dict after an optional delay, so this
+measures what the bot does around an extraction (cache lookup, format
+selection, trimming, caching) rather than YouTube.
+
+    python -m benchmarks.bench_extraction
+"""
+import json
+import asyncio
+from benchmarks.common import measure_async, load_info_dicts
+from utils.yt_helper import YTDLHelper
+from utils.extraction_cache import ExtractionCache
+
+
+"""Stands in for ExtractionPool, answering every URL with the same info dict"""
+class StubExtractor:
+    def __init__(self, info: dict, delay: float = 0.0):
+        self.info = info
+        self.delay = delay
+        self.pending = 0
+        self.calls = 0
+
+    async def extract(self, url, options, profile=None):
+        self.pending += 1
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+            return self.info
+        finally:
+            self.pending -= 1
+
+
+"""
+    Time extract_info on cache misses, cache hits and a burst of concurrent misses.
+
+    Args:
+        delay (float): Seconds the stub takes per extraction in the concurrent case.
+        concurrency (int): Extractions started at once in the concurrent case.
+
+    Returns:
+        dict: Seconds per call for `miss` and `hit`, and the wall time and
+            extractions per second of the `concurrent` burst.
+"""
+async def run(repeat: int = 5, number: int = 200, delay: float = 0.01, concurrency: int = 50) -> dict:
+    info = load_info_dicts()[0]
+    pool, cache = YTDLHelper.pool, YTDLHelper.cache
+    stub = StubExtractor(info)
+    YTDLHelper.pool = stub
+    YTDLHelper.cache = ExtractionCache()
+    urls = (f"https://www.youtube.com/watch?v=bench{n}" for n in range(10 ** 9))
+
+    try:
+        # A new URL each time, so every call goes through the extractor
+        miss = await measure_async(lambda: YTDLHelper.extract_info(next(urls)), repeat, number)
+
+        hit_url = next(urls)
+        await YTDLHelper.extract_info(hit_url)
+        hit = await measure_async(lambda: YTDLHelper.extract_info(hit_url), repeat, number)
+
+        stub.delay = delay
+        started = asyncio.get_running_loop().time()
+        results = await asyncio.gather(*(YTDLHelper.extract_info(next(urls)) for _ in range(concurrency)))
+        elapsed = asyncio.get_running_loop().time() - started
+    finally:
+        YTDLHelper.pool, YTDLHelper.cache = pool, cache
+
+    return {
+        'miss': miss,
+        'hit': hit,
+        'concurrent': {
+            'extractions': concurrency,
+            'failed': sum(result is None for result in results),
+            'stub_delay': delay,
+            'seconds': elapsed,
+            'per_second': concurrency / elapsed,
+        },
+        'extractor_calls': stub.calls,
+    }
+
+
+if __name__ == '__main__':
+    print(json.dumps(asyncio.run(run()), indent=2))
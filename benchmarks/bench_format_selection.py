@@ -0,0 +1,58 @@
+"""
+Time what !play does with an extracted info dict: format selection, trimming for the cache and building the Song.
+
+The info dicts in benchmarks/data/info_dicts.json have the shape and size of
+what yt-dlp returns for a YouTube video (audio, video and combined formats)
+and for a SoundCloud track with MP3 and HLS formats.
+
+    python -m benchmarks.bench_format_selection
+"""
+import json
+from benchmarks.common import measure, load_info_dicts
+from utils.yt_helper import YTDLHelper
+from cogs.music import Song
+
+
+"""Queue a song from an entry the way Music.play does"""
+def song_from_entry(entry: dict, url: str):
+    format = YTDLHelper.select_audio_format(entry)
+    if not format:
+        return None
+    return Song(
+        url=format['url'],
+        title=entry.get('title', 'Unknown Title'),
+        requester='bench',
+        requester_id=0,
+        source=entry.get('webpage_url') or url,
+        http_headers=format.get('http_headers'),
+        codec=YTDLHelper.audio_codec(format),
+        bitrate=format.get('abr'),
+        duration=entry.get('duration')
+    )
+
+
+"""
+    Time format selection on each recorded info dict.
+
+    Returns:
+        dict: Per info dict, the seconds per call of selecting from the full
+            extraction, trimming it, and queuing a song from the trimmed
+            (cached) entry, plus the format that was picked.
+"""
+def run(repeat: int = 5, number: int = 2000) -> dict:
+    results = {}
+    for info in load_info_dicts():
+        audio_format = YTDLHelper.select_audio_format(info)
+        trimmed = YTDLHelper.trim_info(info, audio_format)
+        results[info['id']] = {
+            'formats': len(info['formats']),
+            'selected': audio_format['format_id'] if audio_format else None,
+            'select_full': measure(lambda: YTDLHelper.select_audio_format(info), repeat, number),
+            'trim': measure(lambda: YTDLHelper.trim_info(info, audio_format), repeat, number),
+            'song_from_cached': measure(lambda: song_from_entry(trimmed, info['webpage_url']), repeat, number),
+        }
+    return results
+
+
+if __name__ == '__main__':
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,104 @@
+"""
+Time OllamaService against scripts/fake_ollama.py running in the same process.
+
+The fake server answers instantly by default, so the results show what the
+bot adds on top of Ollama: scheduling, backend selection, HTTP and NDJSON
+parsing, and the response cache.
+
+    python -m benchmarks.bench_ollama
+"""
+import os
+import json
+import time
+import socket
+import asyncio
+from aiohttp import web
+from benchmarks.common import measure_async, summarize
+from scripts.fake_ollama import create_app
+
+MODEL = 'bench'
+
+
+"""Start the fake server on a free local port and return its runner and URL"""
+async def start_fake_ollama(token_delay: float = 0.0, latency: float = 0.0):
+    runner = web.AppRunner(create_app(MODEL, latency=latency, token_delay=token_delay), access_log=None)
+    await runner.setup()
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    await web.SockSite(runner, sock).start()
+    return runner, f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+"""Create the service pointed at `url` only, without campaign notes or a saved response cache"""
+def create_service(url: str):
+    os.environ['OLLAMA_URLS'] = url
+    os.environ['OLLAMA_MODEL'] = MODEL
+    os.environ.pop('CAMPAIGN_NOTES_DIR', None)
+    os.environ.pop('OLLAMA_CACHE_FILE', None)
+
+    from services.ollama import OllamaService
+    from services.response_cache import ResponseCache
+
+    service = OllamaService()
+    service.cache = ResponseCache(path=None)
+    return service
+
+
+"""Stream one response, returning the seconds to the first chunk and to the end"""
+async def time_stream(service, prompt: str):
+    started = time.perf_counter()
+    first = None
+    async for _ in service.stream_text_response(prompt, use_cache=False):
+        if first is None:
+            first = time.perf_counter() - started
+    return first, time.perf_counter() - started
+
+
+"""
+    Time generation, streaming and cache hits through OllamaService.
+
+    Args:
+        concurrency (int): Requests sent at once in the concurrent cases.
+        token_delay (float): Seconds the fake server waits between tokens.
+
+    Returns:
+        dict: Seconds per request for each case, first chunk and total times
+            for streams, and requests per second under concurrency.
+"""
+async def run(repeat: int = 5, number: int = 20, concurrency: int = 16, token_delay: float = 0.0) -> dict:
+    runner, url = await start_fake_ollama(token_delay)
+    service = create_service(url)
+    prompts = (f"Where is the dragon? ({n})" for n in range(10 ** 9))
+    results = {'token_delay': token_delay}
+
+    try:
+        results['generate'] = await measure_async(
+            lambda: service.generate_text_response(next(prompts), use_cache=False), repeat, number
+        )
+
+        streams = [await time_stream(service, next(prompts)) for _ in range(repeat * number)]
+        results['stream_first_chunk'] = summarize([first for first, _ in streams])
+        results['stream_total'] = summarize([total for _, total in streams])
+
+        await service.generate_text_response("Cached question", use_cache=True)
+        results['generate_cached'] = await measure_async(
+            lambda: service.generate_text_response("Cached question", use_cache=True), repeat, number
+        )
+
+        for name, request in (
+            ('generate_concurrent', lambda: service.generate_text_response(next(prompts), use_cache=False)),
+            ('stream_concurrent', lambda: time_stream(service, next(prompts))),
+        ):
+            started = time.perf_counter()
+            await asyncio.gather(*(request() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+            results[name] = {'requests': concurrency, 'seconds': elapsed, 'per_second': concurrency / elapsed}
+    finally:
+        await service.close()
+        await runner.cleanup()
+
+    return results
+
+
+if __name__ == '__main__':
+    print(json.dumps(asyncio.run(run()), indent=2))
@@ -0,0 +1,78 @@
+"""
+Compare the old np.interp resampling of StreamAudioSink with StreamingResampler.
+
+    python -m benchmarks.bench_resampler
+"""
+import time
+import numpy as np
+from utils.resampler import StreamingResampler
+
+IN_RATE = 48000
+OUT_RATE = 16000
+
+# 20 ms of 48 kHz stereo, the size of one voice packet
+PACKET_SAMPLES = 960 * 2
+
+
+"""The resampling StreamAudioSink used before: downmix, then linear interpolation over the whole buffer"""
+def interp_resample(audio: np.ndarray) -> np.ndarray:
+    mono_audio = audio.reshape(-1, 2).mean(axis=1)
+    n_samples = int(np.round(len(mono_audio) * OUT_RATE / IN_RATE))
+    resampled = np.interp(
+        np.linspace(0, len(mono_audio), n_samples),
+        np.arange(len(mono_audio)),
+        mono_audio
+    )
+    return resampled.astype(np.float32)
+
+
+def best_of(function, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+"""
+    Time both resamplers on the same audio.
+
+    Returns:
+        dict: Seconds per second of audio for each case, and the aliasing of a
+            tone above the output Nyquist frequency (lower is better).
+"""
+def run(seconds: float = 5.0) -> dict:
+    rng = np.random.default_rng(0)
+    samples = (rng.standard_normal(int(IN_RATE * seconds) * 2) * 6000).astype(np.int16)
+    packets = [samples[i:i + PACKET_SAMPLES] for i in range(0, len(samples), PACKET_SAMPLES)]
+
+    def interp_block():
+        interp_resample(samples.astype(np.float32) / 32768.0)
+
+    def streaming_block():
+        StreamingResampler(IN_RATE, OUT_RATE).process(samples, last=True)
+
+    def streaming_packets():
+        resampler = StreamingResampler(IN_RATE, OUT_RATE)
+        for packet in packets:
+            resampler.process(packet)
+
+    # A 12 kHz tone has no place in 16 kHz audio, whatever survives is aliasing
+    t = np.arange(int(IN_RATE * seconds)) / IN_RATE
+    tone = np.repeat((np.sin(2 * np.pi * 12000 * t) * 16000).astype(np.int16), 2)
+    interp_alias = interp_resample(tone.astype(np.float32) / 32768.0)
+    streaming_alias = StreamingResampler(IN_RATE, OUT_RATE).process(tone, last=True)
+
+    return {
+        'interp_block': best_of(interp_block) / seconds,
+        'streaming_block': best_of(streaming_block) / seconds,
+        'streaming_packets': best_of(streaming_packets) / seconds,
+        'interp_alias_rms': float(np.sqrt(np.mean(interp_alias ** 2))),
+        'streaming_alias_rms': float(np.sqrt(np.mean(streaming_alias ** 2))),
+    }
+
+
+if __name__ == '__main__':
+    for name, value in run().items():
+        print(f"{name:>20}: {value:.6f}")
@@ -0,0 +1,79 @@
+"""
+Time TTSService with gTTS replaced by a canned MP3.
+
+The MP3 is a tone generated by FFmpeg once, in memory, so the results cover
+what happens after gTTS answers: FFmpeg decoding, Opus encoding and the
+speech cache. FFmpeg and libopus have to be installed, as for the bot.
+
+    python -m benchmarks.bench_tts
+"""
+import json
+import asyncio
+import subprocess
+from benchmarks.common import measure, measure_async
+from services.speech_cache import SpeechCache
+from services.tts import TTSService, encode_opus
+
+
+"""An MP3 of `seconds` of tone, about the length of a spoken sentence"""
+def make_mp3(seconds: float = 2.0) -> bytes:
+    return subprocess.run(
+        ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+         '-i', f'sine=frequency=220:duration={seconds}', '-ac', '1', '-ar', '24000', '-f', 'mp3', 'pipe:1'],
+        check=True, capture_output=True
+    ).stdout
+
+
+"""
+    Time decoding, encoding and cached synthesis of one sentence.
+
+    Args:
+        seconds (float): Length of the canned speech.
+        concurrency (int): Sentences synthesized at once in the concurrent case.
+
+    Returns:
+        dict: Seconds per sentence for each case; `skipped` holds the reason
+            when FFmpeg is missing, and `skipped_opus` when libopus is.
+"""
+async def run(repeat: int = 5, number: int = 5, seconds: float = 2.0, concurrency: int = 3) -> dict:
+    try:
+        mp3 = make_mp3(seconds)
+    except (OSError, subprocess.CalledProcessError) as e:
+        return {'skipped': f"FFmpeg unavailable: {e}"}
+
+    service = TTSService()
+    service._synthesize_mp3 = lambda text, lang: mp3
+    # Memory only, so the disk tier doesn't skew hits or leave files behind
+    service.cache = SpeechCache(directory=None)
+    sentences = (f"Sentence number {n}." for n in range(10 ** 9))
+
+    results = {'speech_seconds': seconds}
+    try:
+        results['synthesize_pcm'] = await measure_async(lambda: service.synthesize_pcm(next(sentences)), repeat, number)
+
+        pcm = await service.synthesize_pcm("Encode me.")
+        try:
+            results['encode_opus'] = measure(lambda: encode_opus(pcm), repeat, number)
+        except Exception as e:
+            results['skipped_opus'] = f"libopus unavailable: {e}"
+            return results
+
+        results['synthesize_opus_miss'] = await measure_async(lambda: service.synthesize_opus(next(sentences)), repeat, number)
+
+        await service.synthesize_opus("Welcome back, adventurers.")
+        results['synthesize_opus_hit'] = await measure_async(
+            lambda: service.synthesize_opus("Welcome back, adventurers."), repeat, number * 100
+        )
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(*(service.synthesize_opus(next(sentences)) for _ in range(concurrency)))
+        results['synthesize_opus_concurrent'] = {'sentences': concurrency, 'seconds': loop.time() - started}
+    finally:
+        await service.cleanup()
+
+    return results
+
+
+if __name__ == '__main__':
+    print(json.dumps(asyncio.run(run()), indent=2))
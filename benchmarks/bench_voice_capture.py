@@ -0,0 +1,100 @@
+"""
+Time StreamAudioSink on synthetic voice packets: buffering, resampling and utterance splitting.
+
+Each speaker sends 20 ms packets of 48 kHz stereo PCM, alternating a second
+of loud noise (speech) and a second of silence, like Discord delivers them.
+
+    python -m benchmarks.bench_voice_capture
+"""
+import json
+from types import SimpleNamespace
+import numpy as np
+from benchmarks.common import measure, scale
+from botTest import StreamAudioSink, POLL_INTERVAL
+
+SAMPLE_RATE = 48000
+
+# 20 ms of 48 kHz stereo 16-bit PCM, the size of one voice packet
+PACKET_BYTES = 3840
+
+
+"""Packets for `seconds` of speech alternating with silence, one second each"""
+def make_packets(seconds: float, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    samples = (rng.standard_normal(int(SAMPLE_RATE * seconds) * 2) * 6000).astype(np.int16)
+    talking = (np.arange(len(samples)) // (SAMPLE_RATE * 2)) % 2 == 0
+    pcm = np.where(talking, samples, 0).astype(np.int16).tobytes()
+    return [pcm[offset:offset + PACKET_BYTES] for offset in range(0, len(pcm), PACKET_BYTES)]
+
+
+"""The buffering StreamAudioSink used before: one bytes object per speaker, extended with every packet"""
+def legacy_buffering(speakers: list, packets: list):
+    buffers = {}
+    for packet in packets:
+        for user in speakers:
+            buffers[user.id] = buffers.get(user.id, b'') + packet
+    return {user_id: np.frombuffer(data, dtype=np.int16) for user_id, data in buffers.items()}
+
+
+"""
+    Time capture for several speakers talking at once.
+
+    Args:
+        speakers (int): Users sending audio at the same time.
+        seconds (float): Audio sent by each of them.
+
+    Returns:
+        dict: Seconds per packet for buffering (old and current), and seconds of
+            processing per second of audio for the whole pipeline and for resampling.
+            The resampler comparison itself is the `resampler` benchmark.
+"""
+def run(repeat: int = 5, speakers: int = 10, seconds: float = 10.0) -> dict:
+    users = [SimpleNamespace(id=n) for n in range(speakers)]
+    packets = make_packets(seconds)
+    frames = [SimpleNamespace(pcm=packet) for packet in packets]
+    writes = len(packets) * speakers
+
+    def sink_buffering():
+        sink = StreamAudioSink(text_channel=None)
+        for frame in frames:
+            for user in users:
+                sink.write(user, frame)
+
+    # Packets delivered between two polls of the processing loop
+    per_poll = max(1, round(POLL_INTERVAL * SAMPLE_RATE * 2 * 2 / PACKET_BYTES))
+
+    def sink_pipeline():
+        sink = StreamAudioSink(text_channel=None)
+        for start in range(0, len(frames), per_poll):
+            for frame in frames[start:start + per_poll]:
+                for user in users:
+                    sink.write(user, frame)
+            sink._process_buffers()
+        return sink
+
+    def resample_packets():
+        sink = StreamAudioSink(text_channel=None)
+        for packet in packets:
+            sink._resample_audio(0, np.frombuffer(packet, dtype=np.int16))
+
+    legacy = measure(lambda: legacy_buffering(users, packets), repeat)
+    current = measure(sink_buffering, repeat)
+    pipeline = measure(sink_pipeline, repeat)
+    resample = measure(resample_packets, repeat)
+
+    sink = sink_pipeline()
+    utterances = sink.utterances.qsize()
+
+    return {
+        'speakers': speakers,
+        'audio_seconds': seconds,
+        'legacy_buffering_per_packet': scale(legacy, writes),
+        'ring_buffering_per_packet': scale(current, writes),
+        'pipeline_per_audio_second': scale(pipeline, seconds),
+        'resample_per_audio_second': scale(resample, seconds),
+        'utterances': utterances,
+    }
+
+
+if __name__ == '__main__':
+    print(json.dumps(run(), indent=2))
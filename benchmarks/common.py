@@ -0,0 +1,71 @@
+"""
+Timing helpers shared by the benchmarks.
+
+Every measurement is reported as a dict of seconds per call, so results from
+different runs can be compared key by key.
+"""
+import os
+import json
+import time
+import statistics
+
+# yt-dlp info dicts the extraction and format selection benchmarks work on
+INFO_DICTS = os.path.join(os.path.dirname(__file__), 'data', 'info_dicts.json')
+
+
+def load_info_dicts() -> list:
+    with open(INFO_DICTS, encoding='utf-8') as file:
+        return json.load(file)
+
+
+"""
+    Summarize timings of single calls.
+
+    Returns:
+        dict: `runs`, and the `min`, `median`, `mean` and `max` seconds per call.
+"""
+def summarize(timings: list) -> dict:
+    return {
+        'runs': len(timings),
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'max': max(timings),
+    }
+
+
+"""Divide the timings of a summary, e.g. to get seconds per item from seconds per batch"""
+def scale(summary: dict, divisor: float) -> dict:
+    return {key: value if key == 'runs' else value / divisor for key, value in summary.items()}
+
+
+"""
+    Time a function, calling it `number` times per run to amortize the timer.
+
+    Args:
+        function (callable): Called with no arguments.
+        repeat (int): Runs to time.
+        number (int): Calls per run.
+
+    Returns:
+        dict: The summary of seconds per call, see `summarize`.
+"""
+def measure(function, repeat: int = 5, number: int = 1) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - started) / number)
+    return summarize(timings)
+
+
+"""Like `measure`, for a coroutine function, awaited in the running event loop"""
+async def measure_async(function, repeat: int = 5, number: int = 1) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            await function()
+        timings.append((time.perf_counter() - started) / number)
+    return summarize(timings)
@@ -0,0 +1,66 @@
+"""
+Run the offline benchmarks and write the results as JSON.
+
+Nothing reaches the network: yt-dlp, Ollama and gTTS are replaced by local
+stand-ins, so runs on the same machine can be compared key by key.
+
+    python -m benchmarks.run                                  # all, printed
+    python -m benchmarks.run --only extraction ollama --output before.json
+
+A benchmark that fails records its error and the others still run.
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import importlib
+import traceback
+
+BENCHMARKS = ('format_selection', 'extraction', 'ollama', 'tts', 'voice_capture', 'resampler')
+
+
+"""Run one benchmark module's `run`, awaiting it if it's a coroutine function"""
+def run_benchmark(name: str) -> dict:
+    started = time.perf_counter()
+    try:
+        module = importlib.import_module(f'benchmarks.bench_{name}')
+        if asyncio.iscoroutinefunction(module.run):
+            results = asyncio.run(module.run())
+        else:
+            results = module.run()
+        return {'ok': True, 'seconds': time.perf_counter() - started, 'results': results}
+    except Exception as e:
+        traceback.print_exc()
+        return {'ok': False, 'seconds': time.perf_counter() - started, 'error': f"{type(e).__name__}: {e}"}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the bot's hot paths")
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, help="Benchmarks to run (default: all)")
+    parser.add_argument('--output', help="File to write the JSON to (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'benchmarks': {},
+    }
+    for name in args.only or BENCHMARKS:
+        print(f"Running {name}...", file=sys.stderr)
+        report['benchmarks'][name] = run_benchmark(name)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+    return 0 if all(result['ok'] for result in report['benchmarks'].values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,8 @@
+from utils.startup import StartupTimer
+
+# Created first so the import time is part of the startup report
+startup = StartupTimer()
+
 import logging
 import discord
 import os
@@ -6,6 +11,10 @@ from discord.ext import commands
 from dotenv import load_dotenv
 from services.ollama import OllamaService
 from services.tts import TTSService
+from services.voice_output import release_output
+from utils import metrics
+
+startup.mark('imports')
 
 # Configure logging
 logging.basicConfig(
@@ -21,10 +30,22 @@ load_dotenv('.env')
 BOT_TOKEN = os.getenv('DISCORD_TOKEN')
 
 # Validate environment variables
-REQUIRED_ENV = ['DISCORD_TOKEN', 'OLLAMA_URL', 'OLLAMA_MODEL']
+REQUIRED_ENV = ['DISCORD_TOKEN', 'OLLAMA_MODEL']
 for var in REQUIRED_ENV:
     if not os.getenv(var):
         raise RuntimeError(f"Missing required environment variable: {var}")
+if not (os.getenv('OLLAMA_URLS') or os.getenv('OLLAMA_URL')):
+    raise RuntimeError("Missing required environment variable: OLLAMA_URL (or OLLAMA_URLS)")
+
+# Cogs loaded by this deployment, e.g. BOT_COGS=basicCommands,music
+COGS = [
+    cog.strip() if cog.strip().startswith('cogs.') else f"cogs.{cog.strip()}"
+    for cog in os.getenv('BOT_COGS', 'basicCommands,music,assistant').split(',')
+    if cog.strip()
+]
+
+# Load yt-dlp, gTTS and the Ollama model in the background once connected ('0' to disable)
+WARM_UP = os.getenv('BOT_WARMUP', '1') != '0'
 
 # Set bot intents
 intents = discord.Intents.default()
@@ -44,9 +65,27 @@ class Bot(commands.Bot):
             ),
             member_cache_flags=discord.MemberCacheFlags.none()
         )
+        self.ollama = None
+        self.tts = None
+        self.metrics_server = None
+        self.warmed_up = False
+
+    """Create the services and load the cogs once the event loop is running"""
+    async def setup_hook(self):
         self.ollama = OllamaService()
         self.tts = TTSService()
 
+        metrics.gauge('voice_clients_active', "Voice channels the bot is connected to").set_function(lambda: len(self.voice_clients))
+        if metrics.METRICS_PORT:
+            self.metrics_server = metrics.MetricsServer()
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                logging.warning(f"Could not start the metrics endpoint: {e}")
+        startup.mark('services')
+
+        await load_cogs(self)
+
     """Called when the bot is fully connected"""
     async def on_ready(self):        
         print(f'Connected as {self.user} (ID: {self.user.id})')
@@ -54,19 +93,49 @@ class Bot(commands.Bot):
             activity=discord.Game(name="type !help for commands")
         )
 
+        # on_ready fires again after reconnects, startup only happens once
+        if not self.warmed_up:
+            self.warmed_up = True
+            startup.mark('connect')
+            logging.info(startup.report())
+            if WARM_UP:
+                asyncio.create_task(self.warm_up())
 
-"""Load all command cogs"""
+    """Release the voice output of a guild the bot left, however it was disconnected"""
+    async def on_voice_state_update(self, member, before, after):
+        if member.id == self.user.id and before.channel and after.channel is None:
+            release_output(member.guild.id)
+
+    """Load heavy dependencies in the background so the first commands don't wait for them"""
+    async def warm_up(self):
+        timer = StartupTimer()
+
+        async def run(name, coroutine):
+            with timer.phase(name):
+                try:
+                    await coroutine
+                except Exception as e:
+                    logging.warning(f"Warm-up of {name} failed: {e}")
+
+        tasks = []
+        if 'cogs.music' in self.extensions:
+            from utils.yt_helper import YTDLHelper
+            tasks.append(run('yt-dlp', YTDLHelper.warm_up()))
+        if 'cogs.assistant' in self.extensions:
+            tasks.append(run('tts', self.tts.warm_up()))
+            tasks.append(run('ollama', self.ollama.warm_up()))
+
+        await asyncio.gather(*tasks)
+        logging.info(timer.report('Warm-up'))
+
+
+"""Load the command cogs selected for this deployment"""
 async def load_cogs(bot: Bot):
     
-    cogs = [
-        "cogs.basicCommands",
-        "cogs.music",
-        "cogs.assistant"
-    ]
-    
-    for cog in cogs:
+    for cog in COGS:
         try:
             await bot.load_extension(cog)
+            startup.mark(cog.removeprefix('cogs.'))
             logging.info(f"Successfully loaded cog: {cog}")
         except Exception as e:
             logging.error(f"Failed to load cog {cog}: {str(e)}")
@@ -76,10 +145,13 @@ async def load_cogs(bot: Bot):
 async def main():
     bot = Bot()
     async with bot:
-        await load_cogs(bot)
         await bot.start(BOT_TOKEN)
-    await bot.ollama.close()
-    await bot.tts.cleanup()
+    if bot.ollama:
+        await bot.ollama.close()
+    if bot.tts:
+        await bot.tts.cleanup()
+    if bot.metrics_server:
+        await bot.metrics_server.stop()
 
 if __name__ == "__main__":
     try:
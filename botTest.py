@@ -1,12 +1,13 @@
 import discord
 import os
+import time
 import asyncio
-import torch
-import whisper
-import numpy as np
-from collections import defaultdict
 from discord.ext import commands, voice_recv
 from dotenv import load_dotenv
+from utils.audio_buffers import PCMRingBuffer
+from utils.resampler import StreamingResampler
+from utils.vad import UtteranceSegmenter, SILENCE_SECONDS, MAX_UTTERANCE_SECONDS
+from services.transcriber import Transcriber
 
 load_dotenv(".env")
 BOT_TOKEN = os.getenv("DISCORD_TOKEN")
@@ -16,16 +17,34 @@ intents.voice_states = True
 intents.message_content = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model = whisper.load_model("base", device=device)
+@bot.event
+async def on_ready():
+    """Start loading Whisper in its worker process once connected"""
+    print(f"Connected as {bot.user}")
+    transcriber.start()
+
+# Whisper runs in its own process, shared by every speaker and guild
+transcriber = Transcriber()
+
+# Seconds of audio kept per speaker before the oldest is dropped: the longest utterance
+# the VAD cuts, plus a margin for a processing loop that fell behind
+SPEAKER_BUFFER_SECONDS = MAX_UTTERANCE_SECONDS + 2
+
+# Seconds between checks for new audio
+POLL_INTERVAL = 0.1
 
 class StreamAudioSink(voice_recv.AudioSink):
     def __init__(self, text_channel):
         self.text_channel = text_channel
-        self.audio_buffers = defaultdict(bytes)
+        self.audio_buffers = {}
+        self.resamplers = {}
+        self.segmenters = {}
+        self.last_audio = {}
+        self.utterances = asyncio.Queue()
+        self.tasks = []
+        self.pending = set()
         self.sample_rate = 48000  # Discord's input sample rate
         self.target_rate = 16000  # Whisper's required sample rate
-        self.buffer_duration = 5  # Process every 5 seconds of audio
         self.processing = False
 
     def wants_opus(self):
@@ -34,71 +53,93 @@ class StreamAudioSink(voice_recv.AudioSink):
     def write(self, user, data):
         """Collect raw PCM audio data from users"""
         if data:
-            self.audio_buffers[user.id] += data.pcm
+            buffer = self.audio_buffers.get(user.id)
+            if buffer is None:
+                # Stereo samples, preallocated once per speaker
+                buffer = self.audio_buffers[user.id] = PCMRingBuffer(int(SPEAKER_BUFFER_SECONDS * self.sample_rate) * 2)
+            buffer.write(data.pcm)
 
     async def process_audio(self):
-        """Process audio buffers at regular intervals"""
+        """Split incoming audio into utterances as it arrives"""
         while self.processing:
-            await asyncio.sleep(self.buffer_duration)
-            await self._process_buffers()
-
-    async def _process_buffers(self):
-        """Convert and transcribe collected audio"""
-        for user_id, buffer in self.audio_buffers.items():
-            if len(buffer) == 0:
+            await asyncio.sleep(POLL_INTERVAL)
+            self._process_buffers()
+
+    def _process_buffers(self):
+        """Resample new audio and queue every utterance that ended"""
+        now = time.monotonic()
+        # Speakers can be added from the voice thread while we iterate
+        for user_id, buffer in list(self.audio_buffers.items()):
+            segmenter = self.segmenters.get(user_id)
+            if segmenter is None:
+                segmenter = self.segmenters[user_id] = UtteranceSegmenter(self.target_rate)
+
+            window = buffer.window()
+            if len(window):
+                # Resample to Whisper's required format straight from the buffered samples
+                utterances = segmenter.feed(self._resample_audio(user_id, window))
+                buffer.consume(len(window))
+                self.last_audio[user_id] = now
+            elif segmenter.active and now - self.last_audio.get(user_id, now) >= SILENCE_SECONDS:
+                # Discord stops sending packets when someone goes quiet
+                utterance = segmenter.flush()
+                utterances = [utterance] if utterance is not None else []
+            else:
                 continue
 
-            try:
-                # Convert raw bytes to numpy array (optimized)
-                audio_array = np.frombuffer(buffer, np.int16)
-                audio_array = audio_array.astype(np.float32) / 32768.0
-                
-                
-                # Resample to Whisper's required format
-                audio_resampled = self._resample_audio(audio_array)
-                
-                # Transcribe using Whisper
-                result = await asyncio.to_thread(
-                    model.transcribe,
-                    audio_resampled,
-                    language='pt',
-                    fp16=False
-                )
-                
-                # Send transcription to text channel
-                user = await bot.fetch_user(user_id)
-                await self.text_channel.send(f"{user.display_name}: {result['text']}")
-
-            except Exception as e:
-                print(f"Processing error: {str(e)}")
-            finally:
-                # Clear processed audio from buffer
-                self.audio_buffers[user_id] = b''
-
-    def _resample_audio(self, audio):
-        """Resample audio from 48kHz to 16kHz and convert to mono"""
-        # Convert stereo to mono by averaging channels
-        mono_audio = audio.reshape(-1, 2).mean(axis=1)
-            
-        # Resample from 48kHz to 16kHz
-        ratio = self.target_rate / self.sample_rate
-        n_samples = int(np.round(len(mono_audio) * ratio))
-        resampled = np.interp(
-            np.linspace(0, len(mono_audio), n_samples),
-            np.arange(len(mono_audio)),
-            mono_audio
-        )
-        return resampled.astype(np.float32)  # Add explicit type conversion here
+            for utterance in utterances:
+                self.utterances.put_nowait((user_id, utterance))
+
+    async def transcribe_utterances(self):
+        """Send utterances to the transcriber as soon as they are complete"""
+        while self.processing:
+            user_id, audio = await self.utterances.get()
+            # Don't wait for the result, so utterances from other speakers can share a batch
+            task = asyncio.create_task(self._transcribe(user_id, audio))
+            self.pending.add(task)
+            task.add_done_callback(self.pending.discard)
+
+    async def _transcribe(self, user_id, audio):
+        """Transcribe one utterance and post it to the text channel"""
+        try:
+            result = await transcriber.transcribe(audio, language='pt')
+            if result is None:
+                # Dropped because the transcriber is overloaded
+                return
+
+            print(f"Transcribed {len(audio) / self.target_rate:.1f}s in {result['latency']:.2f}s (batch of {result['batch']})")
+
+            # Send transcription to text channel
+            user = await bot.fetch_user(user_id)
+            await self.text_channel.send(f"{user.display_name}: {result['text']}")
+
+        except Exception as e:
+            print(f"Processing error: {str(e)}")
+
+    def _resample_audio(self, user_id, samples):
+        """Resample 48kHz stereo int16 audio to 16kHz mono float32"""
+        # One resampler per speaker, its filter state carries over between chunks
+        resampler = self.resamplers.get(user_id)
+        if resampler is None:
+            resampler = self.resamplers[user_id] = StreamingResampler(self.sample_rate, self.target_rate)
+        return resampler.process(samples)
 
     async def start_processing(self):
         """Start the processing loop"""
         self.processing = True
-        asyncio.create_task(self.process_audio())
+        self.tasks = [
+            asyncio.create_task(self.process_audio()),
+            asyncio.create_task(self.transcribe_utterances())
+        ]
 
     def cleanup(self):
         """Stop processing and clear buffers"""
         self.processing = False
+        for task in self.tasks + list(self.pending):
+            task.cancel()
         self.audio_buffers.clear()
+        self.resamplers.clear()
+        self.segmenters.clear()
 
 @bot.command()
 async def join(ctx):
@@ -131,4 +172,9 @@ async def leave(ctx):
     else:
         await ctx.send("Not currently in a voice channel!")
 
-bot.run(BOT_TOKEN)
\ No newline at end of file
+if __name__ == "__main__":
+    # The worker process re-imports this module, so only the parent runs the bot
+    try:
+        bot.run(BOT_TOKEN)
+    finally:
+        transcriber.stop()
\ No newline at end of file
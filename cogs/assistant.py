@@ -2,11 +2,22 @@ import os
 import asyncio
 from discord.ext import commands
 from discord import FFmpegPCMAudio
+from utils.message_stream import StreamingMessage
+
+# Prompts starting with this flag skip the response cache, e.g. `!ask --fresh tell me a story`
+FRESH_FLAG = '--fresh'
 
 class Assistant(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    """Split the --fresh flag off a prompt, returning the prompt and whether the cache may be used."""
+    @staticmethod
+    def parse_prompt(prompt: str):
+        if prompt.startswith(FRESH_FLAG):
+            return prompt[len(FRESH_FLAG):].strip(), False
+        return prompt, True
+
     """Ask the assistant a question and get a spoken response."""
     @commands.command(name='ask')
     async def ask_voice(self, ctx, *, prompt):        
@@ -30,22 +41,34 @@ class Assistant(commands.Cog):
             await ctx.send("Ollama service is unavailable.")
             return
 
-        # Generate AI response
-        async with ctx.typing():
-            response_text = await ollama_service.generate_text_voice_response(prompt)
-
-        if not response_text or "Error" in response_text:
-            await ctx.send("❌ Failed to generate response.")
-            return
-
         # Access TTS cog for speech generation
         tts_service = self.bot.tts
         if not tts_service:
             await ctx.send("TTS service is unavailable.")
             return
 
+        prompt, use_cache = self.parse_prompt(prompt)
+        failed = False
+
+        # Pass generated text on to speech as it streams in, stopping at the first error
+        async def response_chunks():
+            nonlocal failed
+            async for chunk in ollama_service.stream_text_voice_response(
+                prompt, guild_id=ctx.guild.id, use_cache=use_cache, session_key=(ctx.channel.id, 'voice')
+            ):
+                if ollama_service.is_error(chunk):
+                    failed = True
+                    return
+                yield chunk
+
         async with ctx.typing():
-            await tts_service.speak(ctx, text=response_text)
+            response_text = await tts_service.speak_stream(ctx, response_chunks())
+
+        if failed or not response_text.strip():
+            await ctx.send("❌ Failed to generate response.")
+            return
+
+        await ctx.send(f"🔊 **Speaking**: {response_text}")
 
 
     """Ask the assistant a question and get a text response."""
@@ -58,10 +81,36 @@ class Assistant(commands.Cog):
             await ctx.send("Ollama service is unavailable.")
             return
         
+        prompt, use_cache = self.parse_prompt(prompt)
+
+        # Edit a single message as tokens arrive instead of waiting for the full answer
+        stream = StreamingMessage(ctx.channel, prefix="🔊 **Speaking:** ")
         async with ctx.typing():
-            response_text = await ollama_service.generate_text_response(prompt)
+            async for chunk in ollama_service.stream_text_response(
+                prompt, guild_id=ctx.guild.id, use_cache=use_cache, session_key=(ctx.channel.id, 'text')
+            ):
+                await stream.append(chunk)
+        await stream.finish()
+
+        if not stream.messages:
+            await ctx.send("❌ Failed to generate response.")
+
+    """Forget the conversation the assistant has been having in this channel."""
+    @commands.command(name='forget')
+    async def forget(self, ctx):
+        self.bot.ollama.sessions.reset_channel(ctx.channel.id)
+        await ctx.send("🧹 Conversation forgotten. The next question starts fresh.")
+
 
-        await ctx.send(f"🔊 **Speaking:** {response_text}")
+    """Show how busy the assistant is."""
+    @commands.command(name='ask_status')
+    async def ask_status(self, ctx):
+        scheduler = self.bot.ollama.scheduler
+        await ctx.send(
+            f"🧠 Running: {scheduler.active}/{scheduler.max_concurrency} · "
+            f"Waiting: {scheduler.queue_depth} · "
+            f"Average wait: {scheduler.average_wait:.1f}s"
+        )
 
 """Registers the assistant cog with the bot."""
 async def setup(bot):
@@ -33,9 +33,12 @@ class BasicCommands(commands.Cog):
         embed.add_field(name="!help", value="Show this help menu", inline=False)
         embed.add_field(name="!join", value="Join your voice channel", inline=False)
         embed.add_field(name="!leave", value="Leave voice channel", inline=False)
-        embed.add_field(name="!play <url/search>", value="Play music or add to queue (currently this version doesn't support playlists.)", inline=False)
+        embed.add_field(name="!play <url/search>", value="Play music or add to queue (playlist links queue every track)", inline=False)
         embed.add_field(name="!skip", value="Skip current song", inline=False)
-        embed.add_field(name="!queue", value="Show current queue", inline=False)
+        embed.add_field(name="!queue [page]", value="Show current queue", inline=False)
+        embed.add_field(name="!remove <position>", value="Remove a song from the queue", inline=False)
+        embed.add_field(name="!move <from> <to>", value="Move a song to another position in the queue", inline=False)
+        embed.add_field(name="!shuffle / !unshuffle", value="Shuffle the queue or restore its original order", inline=False)
         embed.add_field(name="!repeat", value="Repeat the current song (off by default) - it ignores the queue and loops the current music when the command is executed.", inline=False)
         await ctx.send(embed=embed)
 
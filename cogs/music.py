@@ -1,21 +1,152 @@
 import discord
 import asyncio
+import os
+import shlex
+import subprocess
 from discord.ext import commands
 from discord import FFmpegPCMAudio
 from utils.yt_helper import YTDLHelper
+from utils.extraction_cache import stream_expiry
+from utils.prefetcher import QueuePrefetcher
+from utils.playlist_loader import PlaylistLoader
+from utils.audio_cache import AudioFileCache
+from utils.music_queue import MusicQueue, QueueFull
+from services.voice_output import output_for, PRIORITY_MUSIC
+from utils import metrics
 
 # CONSTS
 
 ffmpeg_options = {
     'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5 -nostdin',
-    'options': '-vn -acodec libopus -b:a 128k -f opus'
+    'options': '-vn'
 }
 
-valid_formats = (
-    'webm', 'opus', 'm4a',
-    'mp3', 'ogg', 'wav',
-    'aac', 'flac'
-)
+# 'passthrough' copies Opus sources without re-encoding, 'transcode' always re-encodes
+PLAYBACK_MODE = os.getenv('MUSIC_PLAYBACK_MODE', 'passthrough')
+
+# Bitrate (kbps) used when a source has to be re-encoded
+TRANSCODE_BITRATE = 128
+
+# Songs per !queue page
+QUEUE_PAGE_SIZE = 10
+
+# Transcoded copies of played tracks, shared by every guild
+audio_cache = AudioFileCache()
+
+SOURCE_START_SECONDS = metrics.histogram('music_source_start_seconds', "Time to start the FFmpeg source for a song", ('kind',))
+PLAYBACK_ERRORS = metrics.counter('music_playback_errors_total', "Songs that stopped because of a playback error")
+
+"""
+Builds the FFmpeg input options for streaming a song.
+
+yt-dlp's `http_headers` (user agent, cookies, referer) are passed along,
+since some sites refuse the stream URL without them.
+
+Args:
+    song (Song): The song to stream.
+
+Returns:
+    str: The `before_options` for FFmpeg.
+"""
+def stream_before_options(song):
+    before_options = ffmpeg_options['before_options']
+    if song.http_headers:
+        headers = ''.join(f"{name}: {value}\r\n" for name, value in song.http_headers.items())
+        before_options += f" -headers {shlex.quote(headers)}"
+    return before_options
+
+
+"""
+FFmpeg Opus source that also writes the track to the audio cache.
+
+FFmpeg sends the same Opus stream to Discord and to the cache file, so a
+track is cached from the download that plays it rather than fetched twice.
+The file is only kept when the track played to the end; skipped or failed
+playback leaves a partial file, which is discarded.
+
+Args:
+    song (Song): The song to play.
+    key (str): The cache key reserved for the song.
+    temp_path (str): Where FFmpeg writes the cached copy.
+    codec (str | None): 'opus' to copy the stream, None to transcode it.
+    bitrate (int): The Opus bitrate in kbps.
+"""
+class CachingOpusAudio(discord.FFmpegOpusAudio):
+    def __init__(self, song, key, temp_path, codec=None, bitrate=TRANSCODE_BITRATE):
+        self.key = key
+        self.temp_path = temp_path
+        self.completed = False
+        self._finished = False
+
+        # Output options before the file name apply to the cache file, the ones after it to Discord's pipe
+        output = f"-map_metadata -1 -f opus -c:a {'copy' if codec == 'opus' else 'libopus'} -ar 48000 -ac 2 -b:a {bitrate}k"
+        super().__init__(
+            song.url, codec=codec, bitrate=bitrate,
+            before_options=f"{stream_before_options(song)} -y",
+            options=f"{ffmpeg_options['options']} {shlex.quote(temp_path)} {output} {ffmpeg_options['options']}"
+        )
+
+    def read(self):
+        packet = super().read()
+        if not packet:
+            self.completed = True
+        return packet
+
+    def cleanup(self):
+        complete = False
+        process = getattr(self, '_process', None)
+        if self.completed and process:
+            # The pipe ends before FFmpeg exits, wait for it to finish the file
+            try:
+                complete = process.wait(timeout=5) == 0
+            except subprocess.TimeoutExpired:
+                pass
+
+        super().cleanup()
+        if not self._finished:
+            self._finished = True
+            audio_cache.finish(self.key, self.temp_path, complete)
+
+
+"""
+Creates the audio source for a song.
+
+Tracks in the local audio cache are read from disk. Otherwise Opus streams
+are copied packet by packet when passthrough is enabled, and anything else
+is transcoded to Opus by FFmpeg. Tracks that can be cached are written to
+the cache while they play.
+
+Args:
+    song (Song): The song to play.
+
+Returns:
+    discord.FFmpegOpusAudio: The audio source.
+"""
+def create_source(song):
+    cached_path = audio_cache.lookup(audio_cache.key_for(song))
+    if cached_path:
+        with SOURCE_START_SECONDS.time(kind='cached'):
+            return discord.FFmpegOpusAudio(cached_path, codec='opus', before_options='-nostdin', options='-vn')
+
+    if PLAYBACK_MODE == 'passthrough' and song.codec == 'opus':
+        # FFmpegOpusAudio maps codec='opus' to '-c:a copy'
+        kind, codec, bitrate = 'passthrough', 'opus', int(song.bitrate or TRANSCODE_BITRATE)
+    else:
+        kind, codec, bitrate = 'transcode', None, TRANSCODE_BITRATE
+
+    reservation = audio_cache.reserve(song)
+    with SOURCE_START_SECONDS.time(kind=kind):
+        if not reservation:
+            return discord.FFmpegOpusAudio(
+                song.url, codec=codec, bitrate=bitrate,
+                before_options=stream_before_options(song), options=ffmpeg_options['options']
+            )
+        key, temp_path = reservation
+        try:
+            return CachingOpusAudio(song, key, temp_path, codec, bitrate)
+        except Exception:
+            audio_cache.finish(key, temp_path, False)
+            raise
 
 """
 Initializes a song object.
@@ -24,38 +155,79 @@ Args:
     url (str): The direct audio URL of the song.
     title (str): The title of the song.
     requester (str): The name of the user who requested the song.
+    requester_id (int | None): The ID of the user who requested the song, used for queue limits.
+    source (str | None): The page URL or query used to resolve a fresh audio URL.
+    http_headers (dict | None): Headers yt-dlp expects when fetching the audio URL.
+    codec (str | None): The audio codec of the stream ('opus', 'aac', ...), if known.
+    bitrate (float | None): The audio bitrate of the stream in kbps, if known.
+    duration (float | None): The length of the song in seconds, if known.
 """
 class Song:
-    def __init__(self, url, title, requester):
+    def __init__(self, url, title, requester, requester_id=None, source=None, http_headers=None,
+                 codec=None, bitrate=None, duration=None):
        
         self.url = url
         self.title = title
         self.requester = requester
+        self.requester_id = requester_id
+        self.source = source
+        self.http_headers = http_headers
+        self.codec = codec
+        self.bitrate = bitrate
+        self.duration = duration
+        self.expires_at = stream_expiry(url)
+        self.probed_url = None
+        self.queue_order = None
         
     """Returns a copy of the song object."""
     def copy(self):        
-        return Song(self.url, self.title, self.requester)
+        return Song(
+            self.url, self.title, self.requester, self.requester_id, self.source,
+            self.http_headers, self.codec, self.bitrate, self.duration
+        )
+
+    """
+        Replaces the audio URL with a freshly resolved one.
+
+        Args:
+            format (dict): The yt-dlp audio format selected for playback.
+            duration (float | None): The song length reported by the extraction.
+    """
+    def update_stream(self, format, duration=None):
+        self.url = format['url']
+        self.http_headers = format.get('http_headers')
+        self.codec = YTDLHelper.audio_codec(format)
+        self.bitrate = format.get('abr')
+        self.duration = duration or self.duration
+        self.expires_at = stream_expiry(self.url)
+        self.probed_url = None
 
 
 """
 Initializes the music state for a Discord guild.
 
 Attributes:
-    queue (list): A list of songs waiting to be played.
+    queue (MusicQueue): The songs waiting to be played.
     current (Song | None): The currently playing song.
     voice_client (discord.VoiceClient | None): The voice connection for the guild.
+    track (VoiceItem | None): The current song's item on the guild's voice output.
     repeat_mode (str): The repeat mode setting ('off' or 'on').
     repeat_song (Song | None): The song to repeat when repeat mode is enabled.
-    original_playlist (list): Stores the original order of songs in case shuffle or repeat is applied.
+    prefetcher (QueuePrefetcher): Keeps the next songs in the queue resolved and probed.
+    resolving (bool): True while the next song's stream URL is being refreshed before playback.
+    playlist_loaders (set): Playlists whose entries are still being resolved in the background.
 """
 class GuildMusicState:
     def __init__(self):        
-        self.queue = []
+        self.queue = MusicQueue()
         self.current = None
         self.voice_client = None
+        self.track = None
         self.repeat_mode = 'off'  # 'off', 'on'
         self.repeat_song = None
-        self.original_playlist = []
+        self.prefetcher = QueuePrefetcher(self)
+        self.resolving = False
+        self.playlist_loaders = set()
 
     """
         Toggles the repeat mode between 'off' and 'on'.
@@ -68,6 +240,15 @@ class GuildMusicState:
             self.repeat_mode = 'off'
             self.repeat_song = None
 
+    """Check whether a song is playing (or paused while the bot speaks)"""
+    def is_playing(self):
+        return self.track is not None and not self.track.finished
+
+    """Stop the current song, the next one starts from its completion callback"""
+    def skip(self):
+        if self.track and self.voice_client:
+            output_for(self.voice_client).cancel(self.track)
+
     """
         Stops playback, clears the queue, and disconnects the bot when no more songs are available.
 
@@ -77,10 +258,56 @@ class GuildMusicState:
         self.queue.clear()
         self.current = None
         self.repeat_song = None
+        self.resolving = False
+        self.prefetcher.stop()
+        for loader in list(self.playlist_loaders):
+            loader.cancel()
         if self.voice_client:
-            asyncio.run_coroutine_threadsafe(self.voice_client.disconnect(), self.voice_client.loop)
+            # Leave once the assistant has finished speaking, not in the middle of it
+            output_for(self.voice_client).disconnect_when_idle()
             self.voice_client = None
 
+    """
+        Starts playing `self.current`, refreshing its stream URL first if it is about to expire.
+
+        Args:
+            ctx (commands.Context): The context of the command.
+            note (str): Suffix for the "Now playing" message.
+            refreshed (bool): True once the URL has already been refreshed for this attempt.
+    """
+    def play_current(self, ctx, note='', refreshed=False):
+        song = self.current
+
+        cached = audio_cache.lookup(audio_cache.key_for(song))
+        if not refreshed and not cached and self.prefetcher.needs_refresh(song):
+            # The prefetcher didn't get to this song in time, resolve it before playing
+            self.resolving = True
+
+            async def refresh_and_play():
+                ok = await self.prefetcher.refresh(song)
+                self.resolving = False
+                if self.current is not song or not self.voice_client:
+                    return
+                if ok:
+                    self.play_current(ctx, note, refreshed=True)
+                else:
+                    await ctx.send(f"❌ Could not load {song.title}, skipping")
+                    self.repeat_song = None
+                    self.check_queue(ctx, None)
+
+            asyncio.run_coroutine_threadsafe(refresh_and_play(), ctx.bot.loop)
+            return
+
+        # Tracks played from the network are cached as they play, so repeat loops and later plays skip it
+        source = create_source(song)
+
+        async def send_and_delete():
+            msg = await ctx.send(f"🎶 Now playing: {song.title}{note}")
+
+        asyncio.run_coroutine_threadsafe(send_and_delete(), ctx.bot.loop)
+        self.track = output_for(self.voice_client).play(
+            source, PRIORITY_MUSIC, after=lambda e: self.check_queue(ctx, e)
+        )
 
     """
         Handles playback continuation when a song finishes or encounters an error.
@@ -92,6 +319,7 @@ class GuildMusicState:
     def check_queue(self, ctx, error):
         
         if error:
+            PLAYBACK_ERRORS.inc()
             print(f"Playback error: {error}")
             self.cleanup()
             return
@@ -99,28 +327,18 @@ class GuildMusicState:
         try:
             if self.repeat_mode == 'on' and self.repeat_song:
                 # If repeat mode is on, replay the same song
-                self.current = self.repeat_song.copy()
-                source = discord.FFmpegOpusAudio(self.current.url, **ffmpeg_options)
-                
-                async def send_and_delete():
-                    msg = await ctx.send(f"🎶 Now playing: {self.current.title} (on repeat)")
-                
-                asyncio.run_coroutine_threadsafe(send_and_delete(), ctx.bot.loop)
-                self.voice_client.play(source, after=lambda e: self.check_queue(ctx, e))
+                self.current = self.repeat_song
+                self.play_current(ctx, " (on repeat)")
             else:
                 if self.queue:
                     # Play the next song in queue
-                    self.current = self.queue.pop(0)
-                    source = discord.FFmpegOpusAudio(self.current.url, **ffmpeg_options)
-                    
-                    async def send_and_delete():
-                        msg = await ctx.send(f"🎶 Now playing: {self.current.title}")
-                    
-                    asyncio.run_coroutine_threadsafe(send_and_delete(), ctx.bot.loop)
-                    self.voice_client.play(source, after=lambda e: self.check_queue(ctx, e))
+                    self.current = self.queue.popleft()
+                    self.prefetcher.wake()
+                    self.play_current(ctx)
                 else:
                     self.cleanup()
         except Exception as e:
+            PLAYBACK_ERRORS.inc()
             print(f"Playback failed: {e}")
             self.cleanup()
 
@@ -136,6 +354,10 @@ class Music(commands.Cog):
         self.bot = bot
         self.guild_states = {}
 
+        metrics.gauge('music_queued_songs', "Songs waiting in every guild's queue").set_function(
+            lambda: sum(len(state.queue) for state in self.guild_states.values())
+        )
+
     """
         Retrieves the music state for a guild, creating one if it doesn't exist.
 
@@ -171,18 +393,24 @@ class Music(commands.Cog):
 
         if ctx.voice_client and ctx.voice_client.is_connected():
             guild_state.voice_client = ctx.voice_client
+            # Stay connected if the last queue just ended and the bot was about to leave
+            output_for(ctx.voice_client).cancel_disconnect()
             if ctx.voice_client.channel != ctx.author.voice.channel:
                 await ctx.voice_client.move_to(ctx.author.voice.channel) 
         else:
             guild_state.voice_client = await ctx.author.voice.channel.connect() 
 
         msg = await ctx.send("⏳ Processing...")
+
+        if YTDLHelper.is_playlist_url(url):
+            return await self.play_playlist(ctx, guild_state, url, msg)
+
         info = await YTDLHelper.extract_info(url)
 
         if not info:
-            return await msg.edit(content="❌ Could not retrieve song information or it's a playlist.")
+            return await msg.edit(content="❌ Could not retrieve song information.")
 
-        # Process the song entry - either a single song or a playlist (playlist won't be supported in this version)
+        # Process the song entry - either a single song or an already resolved playlist
         if '_type' in info and info['_type'] == 'playlist':
             entries = info['entries']
         else:
@@ -193,43 +421,106 @@ class Music(commands.Cog):
             if not entry:
                 continue
                 
-            format = next(
-                (f for f in entry.get('formats', []) if f.get('acodec') != 'none' and f.get('vcodec') == 'none'),
-                None
-            )
-            
+            format = YTDLHelper.select_audio_format(entry)
             if not format:
                 continue
 
-            if not any(fmt in format['url'] for fmt in valid_formats):
-                continue  
-
-            song = Song(url=format['url'], title=entry.get('title', 'Unknown Title'), requester=ctx.author.display_name)
-            guild_state.queue.append(song)
+            song = Song(
+                url=format['url'],
+                title=entry.get('title', 'Unknown Title'),
+                requester=ctx.author.display_name,
+                requester_id=ctx.author.id,
+                source=entry.get('webpage_url') or url,
+                http_headers=format.get('http_headers'),
+                codec=YTDLHelper.audio_codec(format),
+                bitrate=format.get('abr'),
+                duration=entry.get('duration')
+            )
+            try:
+                guild_state.queue.append(song)
+            except QueueFull as e:
+                return await msg.edit(content=f"❌ Can't add to queue: {e}")
             added_songs += 1
 
         if added_songs == 0:
             return await msg.edit(content="❌ No playable audio found")
 
-        if not guild_state.voice_client.is_playing():
+        guild_state.prefetcher.start(self.bot.loop)
+        guild_state.prefetcher.wake()
+
+        if not guild_state.is_playing() and not guild_state.resolving:
             guild_state.check_queue(ctx, None)
             await msg.delete()
         else:
             await msg.edit(content=f"✅ Added {added_songs} songs to queue")
 
 
+    """
+        Queues a playlist without waiting for every entry to be resolved.
+
+        Placeholder songs are queued right away from a flat extraction, playback
+        starts as soon as the first one is resolved, and a PlaylistLoader
+        resolves the rest in the background while editing `msg` with progress.
+
+        Args:
+            ctx (commands.Context): The command context.
+            guild_state (GuildMusicState): The guild's music state.
+            url (str): The playlist URL.
+            msg (discord.Message): The "Processing" message, reused for progress.
+    """
+    async def play_playlist(self, ctx, guild_state, url, msg):
+        playlist = await YTDLHelper.extract_playlist(url)
+
+        if not playlist or not playlist[1]:
+            return await msg.edit(content="❌ Could not retrieve playlist information.")
+
+        title, entries = playlist
+        placeholders = [
+            Song(
+                url=None, title=entry['title'], requester=ctx.author.display_name,
+                requester_id=ctx.author.id, source=entry['url'], duration=entry.get('duration')
+            )
+            for entry in entries
+        ]
+        songs = guild_state.queue.extend(placeholders)
+
+        if not songs:
+            return await msg.edit(content=f"❌ Can't add to queue: {guild_state.queue.check_limits(placeholders[0])}")
+
+        if len(songs) < len(placeholders):
+            await ctx.send(f"⚠️ Only the first {len(songs)} of {len(placeholders)} songs fit in the queue")
+
+        await msg.edit(content=f"📃 Loading **{title}**: 0/{len(songs)} resolved")
+
+        guild_state.prefetcher.start(self.bot.loop)
+        guild_state.prefetcher.wake()
+
+        loader = PlaylistLoader(guild_state, songs, title, msg)
+        guild_state.playlist_loaders.add(loader)
+        loader.start().add_done_callback(lambda _: guild_state.playlist_loaders.discard(loader))
+
+        if not guild_state.is_playing() and not guild_state.resolving:
+            guild_state.check_queue(ctx, None)
+
+
     """Skips the currently playing song."""
     @commands.command()
     async def skip(self, ctx):        
         guild_state = self.get_guild_state(ctx.guild.id)
-        if guild_state.voice_client:
-            guild_state.voice_client.stop()
+        if guild_state.is_playing():
+            guild_state.skip()
             await ctx.send("⏭ Skipped current song")
 
 
-    """Displays the current queue of songs."""
+    """
+        Displays one page of the queue.
+
+        Args:
+            ctx (commands.Context): The command context.
+            page (int): The page to show, 10 songs per page.
+    """
     @commands.command()
-    async def queue(self, ctx):        
+    async def queue(self, ctx, page: int = 1):        
         guild_state = self.get_guild_state(ctx.guild.id)
         embed = discord.Embed(title="Music Queue", color=0x00ff00)
 
@@ -237,12 +528,84 @@ class Music(commands.Cog):
             embed.add_field(name="Now Playing", value=f"**{guild_state.current.title}** (requested by {guild_state.current.requester})", inline=False)
 
         if guild_state.queue:
-            queue_list = "\n".join([f"{i+1}. {song.title} (requested by {song.requester})" for i, song in enumerate(guild_state.queue[:10])])
-            embed.add_field(name=f"Upcoming Songs ({len(guild_state.queue)} total)", value=queue_list, inline=False)
+            pages = (len(guild_state.queue) + QUEUE_PAGE_SIZE - 1) // QUEUE_PAGE_SIZE
+            page = min(max(page, 1), pages)
+            queue_list = "\n".join(
+                f"{i}. {song.title} (requested by {song.requester})"
+                for i, song in guild_state.queue.page(page, QUEUE_PAGE_SIZE)
+            )
+            shuffled = " · shuffled" if guild_state.queue.shuffled else ""
+            embed.add_field(name=f"Upcoming Songs ({len(guild_state.queue)} total{shuffled})", value=queue_list, inline=False)
+            embed.set_footer(text=f"Page {page}/{pages}")
         
         await ctx.send(embed=embed)
 
 
+    """
+        Removes a song from the queue.
+
+        Args:
+            ctx (commands.Context): The command context.
+            position (int): The 1-based position shown by !queue.
+    """
+    @commands.command()
+    async def remove(self, ctx, position: int):
+        guild_state = self.get_guild_state(ctx.guild.id)
+        try:
+            song = guild_state.queue.remove_at(position - 1) if position > 0 else None
+        except IndexError:
+            song = None
+
+        if not song:
+            return await ctx.send("❌ There is no song at that position")
+
+        guild_state.prefetcher.wake()
+        await ctx.send(f"🗑 Removed {song.title} from the queue")
+
+
+    """
+        Moves a song to another position in the queue.
+
+        Args:
+            ctx (commands.Context): The command context.
+            source (int): The 1-based position of the song to move.
+            destination (int): The 1-based position to move it to.
+    """
+    @commands.command()
+    async def move(self, ctx, source: int, destination: int):
+        guild_state = self.get_guild_state(ctx.guild.id)
+        try:
+            if source < 1 or destination < 1:
+                raise IndexError(source)
+            song = guild_state.queue.move(source - 1, destination - 1)
+        except IndexError:
+            return await ctx.send("❌ There is no song at that position")
+
+        guild_state.prefetcher.wake()
+        await ctx.send(f"↕ Moved {song.title} to position {destination}")
+
+
+    """Shuffles the queue. !unshuffle restores the original order."""
+    @commands.command()
+    async def shuffle(self, ctx):
+        guild_state = self.get_guild_state(ctx.guild.id)
+        if not guild_state.queue:
+            return await ctx.send("The queue is empty.")
+
+        guild_state.queue.shuffle()
+        guild_state.prefetcher.wake()
+        await ctx.send("🔀 Queue shuffled")
+
+
+    """Restores the order in which the queued songs were added."""
+    @commands.command()
+    async def unshuffle(self, ctx):
+        guild_state = self.get_guild_state(ctx.guild.id)
+        guild_state.queue.unshuffle()
+        guild_state.prefetcher.wake()
+        await ctx.send("🔀 Queue order restored")
+
+
     """
         Retrieves the music state for a guild, creating one if it doesn't exist.
 
@@ -274,6 +637,11 @@ class Music(commands.Cog):
             await ctx.send("🔂 Repeat mode is now **off**.")
 
 
+    """Stops the extraction workers when the cog is unloaded."""
+    async def cog_unload(self):
+        YTDLHelper.pool.shutdown()
+
+
 """Registers the music cog with the bot."""
 async def setup(bot):    
     await bot.add_cog(Music(bot))
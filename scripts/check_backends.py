@@ -0,0 +1,122 @@
+"""
+Check load balancing and failover across several Ollama backends.
+
+Starts stand-in servers from fake_ollama.py on local ports, spreads
+requests over them, stops one and checks that requests (plain and streamed)
+fail over to the others, then restarts it and checks that it is probed back
+into rotation. Exits with status 1 if any check fails.
+
+    python -m scripts.check_backends
+"""
+import os
+import sys
+import socket
+import asyncio
+import aiohttp
+from aiohttp import web
+from scripts.fake_ollama import create_app
+
+MODEL = 'llama3'
+SERVERS = 3
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+"""A fake Ollama server that can be stopped and started again on the same port"""
+class FakeServer:
+    def __init__(self, port: int, latency: float):
+        self.port = port
+        self.latency = latency
+        self.url = f"http://127.0.0.1:{port}"
+        self.app = None
+        self.runner = None
+        self._served = 0
+
+    """Generation requests served, across restarts"""
+    @property
+    def requests(self) -> int:
+        return self._served + (self.app['requests'] if self.app else 0)
+
+    async def start(self):
+        # An application can't be started again once cleaned up, so every start gets a new one
+        self.app = create_app(MODEL, latency=self.latency, token_delay=0.0)
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, '127.0.0.1', self.port).start()
+
+    async def stop(self):
+        await self.runner.cleanup()
+        self._served += self.app['requests']
+        self.app = None
+        self.runner = None
+
+
+def check(ok: bool, message: str) -> bool:
+    print(f"{'PASS' if ok else 'FAIL'}: {message}")
+    return ok
+
+
+async def main() -> bool:
+    # No campaign notes or saved responses, only the backends are under test
+    os.environ.pop('CAMPAIGN_NOTES_DIR', None)
+    os.environ.pop('OLLAMA_CACHE_FILE', None)
+    from services.backends import BackendPool
+
+    # Each request takes long enough for the others to see it in flight
+    servers = [FakeServer(free_port(), latency=0.2) for _ in range(SERVERS)]
+    for server in servers:
+        await server.start()
+
+    results = []
+    session = aiohttp.ClientSession(connector=BackendPool.connector(len(servers)))
+    pool = BackendPool([server.url for server in servers], session)
+    payload = {"model": MODEL, "prompt": "Hello", "stream": False}
+    try:
+        # Least-loaded routing: concurrent requests are spread evenly
+        responses = await asyncio.gather(*(pool.post_json("/api/generate", payload, MODEL) for _ in range(SERVERS * 3)))
+        counts = [server.requests for server in servers]
+        results.append(check(all(status == 200 for status, _ in responses), "every request succeeded"))
+        results.append(check(counts == [3] * SERVERS, f"requests spread evenly across backends: {counts}"))
+
+        # Failover: the stopped server is skipped and marked down
+        down = servers[0]
+        await down.stop()
+        before = sum(server.requests for server in servers[1:])
+        responses = await asyncio.gather(*(pool.post_json("/api/generate", payload, MODEL) for _ in range(6)))
+        results.append(check(all(status == 200 for status, _ in responses), "requests fail over while a backend is down"))
+        results.append(check(sum(server.requests for server in servers[1:]) - before == 6, "the remaining backends served them"))
+        results.append(check(not pool.backends[0].healthy, "the stopped backend is marked unhealthy"))
+
+        # Streaming goes through the same failover
+        os.environ['OLLAMA_URLS'] = ','.join(server.url for server in servers)
+        os.environ['OLLAMA_MODEL'] = MODEL
+        from services.ollama import OllamaService
+        service = OllamaService()
+        try:
+            text = ''.join([chunk async for chunk in service.stream_text_response("Hello", use_cache=False)])
+        finally:
+            await service.close()
+        results.append(check(bool(text) and not OllamaService.is_error(text), f"streamed reply during failover: {text[:40]!r}"))
+
+        # Recovery: the next probe puts the server back in rotation
+        await down.start()
+        await pool._probe(pool.backends[0])
+        results.append(check(pool.backends[0].healthy, "the restarted backend is healthy again"))
+        await asyncio.gather(*(pool.post_json("/api/generate", payload, MODEL) for _ in range(SERVERS)))
+        results.append(check(down.requests > 3, "the restarted backend receives requests"))
+    finally:
+        await pool.close()
+        await session.close()
+        for server in servers:
+            if server.runner:
+                await server.stop()
+
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if asyncio.run(main()) else 1)
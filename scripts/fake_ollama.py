@@ -0,0 +1,76 @@
+"""
+Stand-in Ollama server for local testing.
+
+Implements the endpoints the bot uses (/api/tags, /api/ps, /api/generate and
+/api/embed) with canned output, so the backend pool can be exercised without
+a GPU. Start a few on different ports and point OLLAMA_URLS at them:
+
+    python scripts/fake_ollama.py --port 11501 &
+    python scripts/fake_ollama.py --port 11502 --latency 0.2 &
+    OLLAMA_URLS=http://localhost:11501,http://localhost:11502 python bot.py
+"""
+import json
+import asyncio
+import hashlib
+import argparse
+from aiohttp import web
+
+WORDS = "The dragon sleeps beneath the mountain and the party should tread carefully .".split()
+
+
+def create_app(model: str = 'llama3', latency: float = 0.0, token_delay: float = 0.02,
+               embed_dimensions: int = 64) -> web.Application:
+    app = web.Application()
+    app['requests'] = 0
+
+    async def tags(request):
+        return web.json_response({"models": [{"name": f"{model}:latest"}]})
+
+    async def ps(request):
+        return web.json_response({"models": [{"name": f"{model}:latest"}]})
+
+    async def generate(request):
+        payload = await request.json()
+        app['requests'] += 1
+        await asyncio.sleep(latency)
+
+        if payload.get('stream', True):
+            response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+            await response.prepare(request)
+            for word in WORDS:
+                await response.write(json.dumps({"response": word + " ", "done": False}).encode() + b"\n")
+                await asyncio.sleep(token_delay)
+            await response.write(json.dumps({"response": "", "done": True, "context": [1, 2, 3]}).encode() + b"\n")
+            await response.write_eof()
+            return response
+
+        await asyncio.sleep(token_delay * len(WORDS))
+        return web.json_response({"response": " ".join(WORDS), "done": True, "context": [1, 2, 3]})
+
+    async def embed(request):
+        payload = await request.json()
+        await asyncio.sleep(latency)
+        inputs = payload['input'] if isinstance(payload['input'], list) else [payload['input']]
+        # Deterministic pseudo-embeddings derived from the text
+        embeddings = []
+        for text in inputs:
+            digest = hashlib.sha256(text.encode()).digest() * (embed_dimensions // 32 + 1)
+            embeddings.append([byte / 255 - 0.5 for byte in digest[:embed_dimensions]])
+        return web.json_response({"model": payload.get('model'), "embeddings": embeddings})
+
+    app.router.add_get('/api/tags', tags)
+    app.router.add_get('/api/ps', ps)
+    app.router.add_post('/api/generate', generate)
+    app.router.add_post('/api/embed', embed)
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stand-in Ollama server")
+    parser.add_argument('--port', type=int, default=11500)
+    parser.add_argument('--model', default='llama3')
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds before each response starts")
+    parser.add_argument('--token-delay', type=float, default=0.02, help="Seconds between streamed tokens")
+    args = parser.parse_args()
+
+    web.run_app(create_app(args.model, args.latency, args.token_delay), port=args.port)
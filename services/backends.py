@@ -0,0 +1,174 @@
+import os
+import time
+import asyncio
+import logging
+import aiohttp
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Seconds between health and latency probes
+HEALTH_INTERVAL = float(os.getenv('OLLAMA_HEALTH_INTERVAL', 15))
+
+# Open connections allowed per backend
+CONNECTIONS_PER_BACKEND = int(os.getenv('OLLAMA_CONNECTIONS_PER_BACKEND', 8))
+
+PROBE_TIMEOUT = aiohttp.ClientTimeout(total=5)
+
+# Weight of the newest sample in the latency average
+LATENCY_SMOOTHING = 0.3
+
+
+"""Read the configured backend URLs: OLLAMA_URLS (comma separated), falling back to OLLAMA_URL"""
+def configured_urls() -> list:
+    urls = os.getenv('OLLAMA_URLS') or os.getenv('OLLAMA_URL') or ''
+    return [url.strip().rstrip('/') for url in urls.split(',') if url.strip()]
+
+
+"""Raised when no backend could serve a request."""
+class NoBackendAvailable(Exception):
+    pass
+
+
+"""
+One Ollama server.
+
+Attributes:
+    url (str): The server's base URL.
+    healthy (bool): False after a failed probe or connection error, until the next successful probe.
+    models (set | None): Models available on the server, None until the first probe.
+    loaded (set): Models currently loaded in memory.
+    inflight (int): Requests currently being served.
+    latency (float | None): Smoothed probe round-trip time in seconds.
+"""
+class OllamaBackend:
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = True
+        self.models = None
+        self.loaded = set()
+        self.inflight = 0
+        self.latency = None
+
+    """Check whether the model can run on this server (unknown counts as yes until probed)"""
+    def has_model(self, model: str) -> bool:
+        if self.models is None or not model:
+            return True
+        return model in self.models or f"{model}:latest" in self.models
+
+    def has_loaded(self, model: str) -> bool:
+        return model in self.loaded or f"{model}:latest" in self.loaded
+
+    def record_latency(self, seconds: float):
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += LATENCY_SMOOTHING * (seconds - self.latency)
+
+
+"""
+Load-balanced set of Ollama servers.
+
+Requests go to the healthy server with the fewest requests in flight,
+preferring servers that already have the model loaded and then lower
+latency. A background task probes every server periodically; a connection
+error marks a server unhealthy right away and the request fails over to the
+next candidate.
+
+Attributes:
+    backends (list[OllamaBackend]): The configured servers.
+"""
+class BackendPool:
+    def __init__(self, urls: list, session: aiohttp.ClientSession):
+        self.backends = [OllamaBackend(url) for url in urls]
+        self.session = session
+        self._health_task = None
+
+    """Build a connector with per-backend connection limits"""
+    @staticmethod
+    def connector(backend_count: int) -> aiohttp.TCPConnector:
+        return aiohttp.TCPConnector(
+            limit=CONNECTIONS_PER_BACKEND * max(backend_count, 1),
+            limit_per_host=CONNECTIONS_PER_BACKEND
+        )
+
+    """Start the health probes if they aren't running"""
+    def start(self):
+        if not self._health_task or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self):
+        if self._health_task:
+            self._health_task.cancel()
+
+    """Backends able to serve a model, best first"""
+    def candidates(self, model: str) -> list:
+        self.start()
+        # If no server reports the model, try them all and let Ollama report the error
+        usable = [b for b in self.backends if b.has_model(model)] or self.backends
+        return sorted(
+            usable,
+            key=lambda b: (not b.healthy, not b.has_loaded(model), b.inflight, b.latency or 0)
+        )
+
+    """Count a request against a backend while it is in flight"""
+    @asynccontextmanager
+    async def track(self, backend: OllamaBackend):
+        backend.inflight += 1
+        try:
+            yield backend
+        finally:
+            backend.inflight -= 1
+
+    """Take a backend out of rotation until its next successful probe"""
+    def mark_down(self, backend: OllamaBackend, error: Exception):
+        if backend.healthy:
+            logger.warning(f"Ollama backend {backend.url} unavailable: {error}")
+        backend.healthy = False
+
+    """
+        POST a JSON request to the best backend, failing over on connection errors.
+
+        Returns:
+            tuple[int, dict | str]: The HTTP status and the JSON body (or text on error).
+
+        Raises:
+            NoBackendAvailable: If every backend failed to connect.
+    """
+    async def post_json(self, path: str, payload: dict, model: str = None):
+        last_error = None
+        for backend in self.candidates(model):
+            async with self.track(backend):
+                try:
+                    async with self.session.post(f"{backend.url}{path}", json=payload) as response:
+                        if response.status == 200:
+                            return response.status, await response.json()
+                        return response.status, await response.text()
+                except aiohttp.ClientConnectionError as e:
+                    self.mark_down(backend, e)
+                    last_error = e
+        raise NoBackendAvailable(f"No Ollama backend available: {last_error}")
+
+    async def _probe(self, backend: OllamaBackend):
+        started = time.monotonic()
+        try:
+            async with self.session.get(f"{backend.url}/api/tags", timeout=PROBE_TIMEOUT) as response:
+                response.raise_for_status()
+                tags = await response.json()
+            backend.record_latency(time.monotonic() - started)
+
+            async with self.session.get(f"{backend.url}/api/ps", timeout=PROBE_TIMEOUT) as response:
+                running = await response.json() if response.status == 200 else {}
+
+            backend.models = {model['name'] for model in tags.get('models', [])}
+            backend.loaded = {model['name'] for model in running.get('models', [])}
+            if not backend.healthy:
+                logger.info(f"Ollama backend {backend.url} is back")
+            backend.healthy = True
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            self.mark_down(backend, e)
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.gather(*(self._probe(backend) for backend in self.backends))
+            await asyncio.sleep(HEALTH_INTERVAL)
@@ -1,70 +1,313 @@
 import os
+import json
+import time
+import asyncio
 import aiohttp
+from services.scheduler import RequestScheduler, QueueTimeout, MAX_CONCURRENCY, PRIORITY_TEXT, PRIORITY_VOICE
+from services.response_cache import ResponseCache
+from services.sessions import SessionStore
+from services.retrieval import NotesIndex
+from services.backends import BackendPool, NoBackendAvailable, configured_urls
+from utils import metrics
+
+# How long Ollama keeps the model loaded after a request
+KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+
+# Shown when a request waited too long for a slot, or a backend took too long to answer
+BUSY_MESSAGE = "Error: the assistant is busy, try again in a moment."
+TIMEOUT_MESSAGE = "Error: the assistant took too long to answer, try again."
+
+REQUEST_SECONDS = metrics.histogram('ollama_request_seconds', "Time from request to complete response", ('mode',))
+FIRST_TOKEN_SECONDS = metrics.histogram('ollama_first_token_seconds', "Time from request to the first streamed token, queueing included")
+CACHE_HITS = metrics.counter('ollama_cache_hits_total', "Responses served from the response cache")
 
 class OllamaService:
     def __init__(self):
-        self.base_url = os.getenv('OLLAMA_URL')
+        urls = configured_urls()
         self.default_model = os.getenv('OLLAMA_MODEL')
-        self.session = aiohttp.ClientSession()
+        self.session = aiohttp.ClientSession(connector=BackendPool.connector(len(urls)))
+        self.backends = BackendPool(urls, self.session)
+        # Every backend adds its own slots, so more servers means more requests at once
+        self.scheduler = RequestScheduler(max_concurrency=MAX_CONCURRENCY * max(len(urls), 1))
+        self.cache = ResponseCache()
+        self.sessions = SessionStore()
+        self.notes = NotesIndex(self.backends)
+        self._drains = set()
 
-    """Generate text using Ollama's API with test limits"""
-    async def generate_text_response(self, prompt: str, model: str = None) -> str:
-        model = model or self.default_model
-        url = f"{self.base_url}/api/generate"
-        system_instruction = os.getenv('PROMPT_TEXT')
+        metrics.gauge('ollama_queue_depth', "Requests waiting for a scheduler slot").set_function(lambda: self.scheduler.queue_depth)
+        metrics.gauge('ollama_active_requests', "Requests running on the backends").set_function(lambda: self.scheduler.active)
+        metrics.gauge('ollama_healthy_backends', "Backends that passed their last health check").set_function(
+            lambda: sum(backend.healthy for backend in self.backends.backends)
+        )
 
+    """Prepend the campaign notes relevant to a prompt, if any"""
+    async def _with_notes(self, prompt: str) -> str:
+        try:
+            chunks = await self.notes.search(prompt)
+        except Exception as e:
+            print(f"Notes lookup failed: {str(e)[:200]}")
+            return prompt
+
+        if not chunks:
+            return prompt
+
+        notes = "\n\n".join(f"[{chunk['source']}] {chunk['text']}" for chunk in chunks)
+        return f"Relevant campaign notes:\n{notes}\n\nQuestion: {prompt}"
+
+    """Build the /api/generate payload for a prompt, continuing the conversation if there is one"""
+    def _build_payload(self, prompt: str, system_instruction: str, model: str, max_tokens: int,
+                       stream: bool, conversation=None) -> dict:
         payload = {
             "model": model,
             "prompt": f"{system_instruction}\n\nUser: {prompt}\nAssistant:",
-            "stream": False,
+            "stream": stream,
+            "keep_alive": KEEP_ALIVE,
             "options": {
                 "temperature": 0.7,
-                "max_tokens": 900
+                "num_predict": max_tokens
             }
         }
 
+        if conversation and conversation.context:
+            # The system prompt and earlier turns are already part of the context
+            payload["prompt"] = f"User: {prompt}\nAssistant:"
+            payload["context"] = conversation.context
+
+        return payload
+
+    """Cache key for a payload built from these arguments, or None when the cache can't be used"""
+    def _cache_key(self, prompt: str, system_instruction: str, payload: dict, use_cache: bool) -> str:
+        # Answers that depend on earlier turns are never cached
+        if not use_cache or "context" in payload:
+            return None
+        return self.cache.key(payload['model'], system_instruction, prompt, payload['options'])
+
+    """Look up the conversation session for a key, if the request is part of one"""
+    def _conversation(self, session_key):
+        return self.sessions.get(session_key) if session_key is not None else None
+
+    """Send a non-streaming request through the cache and scheduler, sharing identical requests in flight"""
+    async def _generate(self, url: str, payload: dict, limit: int, guild_id: int, priority: int,
+                        cache_key: str, conversation=None) -> str:
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            # Answers cached without a context can't continue a conversation
+            if cached is not None and not (conversation and cached['context'] is None):
+                CACHE_HITS.inc()
+                if conversation:
+                    conversation.update(cached['context'])
+                return cached['response'][:limit]
+
+        key = (url, json.dumps(payload, sort_keys=True))
+        try:
+            response, context = await self.scheduler.run(key, guild_id, priority, lambda: self._post(url, payload, limit))
+        except QueueTimeout:
+            return BUSY_MESSAGE
+
+        if not self.is_error(response):
+            if conversation:
+                conversation.update(context)
+            if cache_key:
+                self.cache.set(cache_key, {'response': response, 'context': context})
+        return response
+
+    async def _post(self, url: str, payload: dict, limit: int):
         try:
-            async with self.session.post(url, json=payload) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data['response'][:2000]  # Maximum Discord Limit
-                else:
-                    error = await response.text()
-                    return f"Error: {response.status} - {error[:150]}..."
+            with REQUEST_SECONDS.time(mode='generate'):
+                status, data = await self.backends.post_json(url, payload, payload['model'])
+            if status == 200:
+                return data['response'][:limit], data.get('context')
+            else:
+                return f"Error: {status} - {str(data)[:150]}...", None
+        except NoBackendAvailable as e:
+            return f"Connection error: {str(e)[:200]}", None
+        except asyncio.TimeoutError:
+            return TIMEOUT_MESSAGE, None
         except aiohttp.ClientError as e:
-            return f"Connection error: {str(e)[:200]}"
+            return f"Connection error: {str(e)[:200]}", None
         except Exception as e:
-            return f"Unexpected error: {str(e)[:200]}"
-        
+            return f"Unexpected error: {str(e)[:200]}", None
 
-    """Generate text for voice response using Ollama's API with test limits"""
-    async def generate_text_voice_response(self, prompt: str, model: str = None) -> str:        
+    """Generate text using Ollama's API with test limits"""
+    async def generate_text_response(self, prompt: str, model: str = None, guild_id: int = None,
+                                     use_cache: bool = True, session_key=None) -> str:
         model = model or self.default_model
-        url = f"{self.base_url}/api/generate"
-        system_instruction = os.getenv('PROMPT_VOICE')
+        url = "/api/generate"
+        system_instruction = os.getenv('PROMPT_TEXT')
 
-        payload = {
-          "model": self.default_model,
-          "prompt": f"{system_instruction}\n\nUser: {prompt}\nAssistant:",
-          "stream": False,
-          "options": {
-              "temperature": 0.7,
-              "max_tokens": 200 
-          }
-        }
+        prompt = await self._with_notes(prompt)
+        conversation = self._conversation(session_key)
+        payload = self._build_payload(prompt, system_instruction, model, 900, False, conversation)
+        cache_key = self._cache_key(prompt, system_instruction, payload, use_cache)
 
+        # Maximum Discord Limit
+        return await self._generate(url, payload, 2000, guild_id, PRIORITY_TEXT, cache_key, conversation)
+
+
+    """Stream text from Ollama's API, yielding chunks as the model produces them"""
+    async def stream_text_response(self, prompt: str, model: str = None, guild_id: int = None,
+                                   use_cache: bool = True, session_key=None):
+        model = model or self.default_model
+        url = "/api/generate"
+        system_instruction = os.getenv('PROMPT_TEXT')
+
+        prompt = await self._with_notes(prompt)
+        conversation = self._conversation(session_key)
+        payload = self._build_payload(prompt, system_instruction, model, 900, True, conversation)
+        cache_key = self._cache_key(prompt, system_instruction, payload, use_cache)
+
+        async for chunk in self._stream(url, payload, guild_id, PRIORITY_TEXT, cache_key, conversation):
+            yield chunk
+
+
+    """Read an NDJSON generation stream while holding a scheduler slot, yielding the text of each chunk"""
+    async def _stream(self, url: str, payload: dict, guild_id: int, priority: int, cache_key: str, conversation=None):
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            # Answers cached without a context can't continue a conversation
+            if cached is not None and not (conversation and cached['context'] is None):
+                CACHE_HITS.inc()
+                if conversation:
+                    conversation.update(cached['context'])
+                yield cached['response']
+                return
+
+        started = time.perf_counter()
+        chunks = []
         try:
-            async with self.session.post(url, json=payload) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data['response'][:200]
-                else:
-                    error = await response.text()
-                    return f"Error: {response.status} - {error[:150]}..."
+            async with self.scheduler.slot(guild_id, priority):
+                # Fail over to the next backend as long as nothing has been streamed yet
+                for backend in self.backends.candidates(payload['model']):
+                    async with self.backends.track(backend):
+                        try:
+                            response = await self.session.post(f"{backend.url}{url}", json=payload)
+                        except aiohttp.ClientConnectionError as e:
+                            self.backends.mark_down(backend, e)
+                            continue
+
+                        async with response:
+                            if response.status != 200:
+                                error = await response.text()
+                                yield f"Error: {response.status} - {error[:150]}..."
+                                return
+
+                            async for line in response.content:
+                                if not line.strip():
+                                    continue
+                                data = json.loads(line)
+                                if data.get('error'):
+                                    yield f"Error: {data['error'][:150]}"
+                                    return
+                                if data.get('response'):
+                                    if not chunks:
+                                        FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+                                    chunks.append(data['response'])
+                                    yield data['response']
+                                if data.get('done'):
+                                    # Only complete generations are remembered and cached
+                                    REQUEST_SECONDS.observe(time.perf_counter() - started, mode='stream')
+                                    context = data.get('context')
+                                    if conversation:
+                                        conversation.update(context)
+                                    if cache_key:
+                                        self.cache.set(cache_key, {'response': ''.join(chunks), 'context': context})
+                                    return
+                        return
+
+                yield "Connection error: no Ollama backend available"
+        except QueueTimeout:
+            yield BUSY_MESSAGE
+        except asyncio.TimeoutError:
+            # The backend stopped answering while the request held its slot
+            yield TIMEOUT_MESSAGE
         except aiohttp.ClientError as e:
-            return f"Connection error: {str(e)[:200]}"
+            yield f"Connection error: {str(e)[:200]}"
         except Exception as e:
-            return f"Unexpected error: {str(e)[:200]}"
+            yield f"Unexpected error: {str(e)[:200]}"
+        
+
+    """Stream text for voice response from Ollama's API, stopping at the voice length limit"""
+    async def stream_text_voice_response(self, prompt: str, model: str = None, guild_id: int = None,
+                                         use_cache: bool = True, session_key=None):
+        model = model or self.default_model
+        url = "/api/generate"
+        system_instruction = os.getenv('PROMPT_VOICE')
+
+        prompt = await self._with_notes(prompt)
+        conversation = self._conversation(session_key)
+        payload = self._build_payload(prompt, system_instruction, model, 200, True, conversation)
+        cache_key = self._cache_key(prompt, system_instruction, payload, use_cache)
+
+        remaining = 200
+        spoken = []
+        draining = False
+        stream = self._stream(url, payload, guild_id, PRIORITY_VOICE, cache_key, conversation)
+        try:
+            async for chunk in stream:
+                spoken.append(chunk[:remaining])
+                yield chunk[:remaining]
+                remaining -= len(chunk)
+                if remaining <= 0:
+                    if conversation is not None and not self.is_error(spoken[0]):
+                        # The session only advances with the context sent at the end of
+                        # the reply, so read the rest of it in the background, unspoken
+                        self._drain(stream)
+                        draining = True
+                    elif cache_key and not self.is_error(spoken[0]):
+                        # Cut off at the voice limit, cache what was actually spoken
+                        self.cache.set(cache_key, {'response': ''.join(spoken), 'context': None})
+                    break
+        finally:
+            if not draining:
+                # Close the HTTP response right away so the model stops generating
+                await stream.aclose()
+
+    """Read the rest of a stream without using it, so it completes its session and cache updates"""
+    def _drain(self, stream):
+        async def drain():
+            try:
+                async for _ in stream:
+                    pass
+            finally:
+                await stream.aclose()
+
+        task = asyncio.create_task(drain())
+        self._drains.add(task)
+        task.add_done_callback(self._drains.discard)
+
+
+    """Check whether a response is one of the error messages returned by this service"""
+    @staticmethod
+    def is_error(text: str) -> bool:
+        return text.startswith(("Error:", "Connection error:", "Unexpected error:"))
+
+
+    """Generate text for voice response using Ollama's API with test limits"""
+    async def generate_text_voice_response(self, prompt: str, model: str = None, guild_id: int = None,
+                                           use_cache: bool = True, session_key=None) -> str:        
+        model = model or self.default_model
+        url = "/api/generate"
+        system_instruction = os.getenv('PROMPT_VOICE')
+
+        prompt = await self._with_notes(prompt)
+        conversation = self._conversation(session_key)
+        payload = self._build_payload(prompt, system_instruction, model, 200, False, conversation)
+        cache_key = self._cache_key(prompt, system_instruction, payload, use_cache)
+
+        return await self._generate(url, payload, 200, guild_id, PRIORITY_VOICE, cache_key, conversation)
+
+    """Start the backend health probes and load the default model ahead of the first question"""
+    async def warm_up(self):
+        self.backends.start()
+        # A request without a prompt only loads the model into memory
+        payload = {"model": self.default_model, "keep_alive": KEEP_ALIVE}
+        status, data = await self.backends.post_json("/api/generate", payload, self.default_model)
+        if status != 200:
+            print(f"Could not preload {self.default_model}: {status} - {str(data)[:150]}")
 
     async def close(self):
-        await self.session.close()
\ No newline at end of file
+        for task in list(self._drains):
+            task.cancel()
+        self.cache.save()
+        await self.backends.close()
+        await self.session.close()
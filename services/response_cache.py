@@ -0,0 +1,102 @@
+import os
+import re
+import json
+import time
+import hashlib
+from collections import OrderedDict
+
+# Maximum number of cached responses
+CACHE_SIZE = int(os.getenv('OLLAMA_CACHE_SIZE', 512))
+
+# Seconds a cached response stays valid
+CACHE_TTL = float(os.getenv('OLLAMA_CACHE_TTL', 24 * 60 * 60))
+
+# Optional JSON file the cache is loaded from and saved to
+CACHE_FILE = os.getenv('OLLAMA_CACHE_FILE')
+
+
+"""
+LRU cache of generated responses with a TTL and optional on-disk persistence.
+
+Keys are built from the model, the system prompt, the normalized user prompt
+and the generation options, so the same question asked with different
+whitespace, case or trailing punctuation maps to one entry.
+
+Attributes:
+    max_entries (int): Maximum number of cached responses.
+    ttl (float): Seconds a response stays valid.
+    path (str | None): File used for persistence, if any.
+"""
+class ResponseCache:
+    def __init__(self, max_entries: int = CACHE_SIZE, ttl: float = CACHE_TTL, path: str = CACHE_FILE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+        if path:
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    """Lowercase the prompt and drop extra whitespace and trailing punctuation"""
+    @staticmethod
+    def normalize_prompt(prompt: str) -> str:
+        return re.sub(r'\s+', ' ', prompt.strip().lower()).rstrip(' ?!.')
+
+    """Build the cache key for a request"""
+    def key(self, model: str, system_instruction: str, prompt: str, options: dict) -> str:
+        raw = json.dumps(
+            [model, system_instruction or '', self.normalize_prompt(prompt), options],
+            sort_keys=True
+        )
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    """Return the cached value for a key, or None if missing or expired"""
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    """Store a value, evicting the least recently used entries over the size limit"""
+    def set(self, key: str, value):
+        self._entries[key] = (time.time() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    """Load unexpired entries from the cache file"""
+    def load(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        now = time.time()
+        for key, expires_at, value in entries[-self.max_entries:]:
+            if expires_at > now:
+                self._entries[key] = (expires_at, value)
+
+    """Write the cache to its file, if persistence is enabled"""
+    def save(self):
+        if not self.path:
+            return
+
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump([[key, expires_at, value] for key, (expires_at, value) in self._entries.items()], f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Could not save response cache: {e}")
@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Folder with campaign notes (.md/.txt), retrieval is disabled when unset
+NOTES_DIR = os.getenv('CAMPAIGN_NOTES_DIR')
+
+# Where the embedding matrix and chunk metadata are stored
+INDEX_DIR = os.getenv('CAMPAIGN_INDEX_DIR', '.notes_index')
+
+# Ollama model used for embeddings
+EMBED_MODEL = os.getenv('OLLAMA_EMBED_MODEL', 'nomic-embed-text')
+
+# Number of chunks injected into a prompt, and the minimum similarity for a chunk to count
+TOP_K = int(os.getenv('NOTES_TOP_K', 4))
+MIN_SCORE = float(os.getenv('NOTES_MIN_SCORE', 0.35))
+
+# Target chunk length in characters
+CHUNK_SIZE = 800
+
+# Chunks sent per embedding request
+EMBED_BATCH = 32
+
+# Seconds between checks of the notes folder for changes
+RESCAN_INTERVAL = 30
+
+NOTE_EXTENSIONS = ('.md', '.txt')
+
+
+"""Split a note into chunks of about `size` characters, keeping paragraphs together"""
+def chunk_text(text: str, size: int = CHUNK_SIZE) -> list:
+    chunks = []
+    current = ''
+
+    for paragraph in (p.strip() for p in text.split('\n\n')):
+        if not paragraph:
+            continue
+        # Paragraphs longer than a chunk are split on their own
+        while len(paragraph) > size:
+            cut = paragraph.rfind(' ', 0, size)
+            cut = cut if cut > 0 else size
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.append(paragraph[:cut].strip())
+            paragraph = paragraph[cut:].strip()
+
+        if current and len(current) + len(paragraph) + 2 > size:
+            chunks.append(current)
+            current = ''
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+"""
+Embedding index over the campaign notes.
+
+Notes are split into chunks, and each chunk is embedded once: when notes
+change, only chunks whose text is new are sent to the embedding model. The
+normalized embeddings live in a float32 matrix saved as .npy and memory-mapped
+back, so a search is a single matrix-vector product over every chunk.
+
+Attributes:
+    notes_dir (str): The folder with campaign notes.
+    index_dir (str): The folder where the index is stored.
+    embed_model (str): The Ollama embedding model.
+"""
+class NotesIndex:
+    def __init__(self, backends, notes_dir: str = NOTES_DIR, index_dir: str = INDEX_DIR,
+                 embed_model: str = EMBED_MODEL):
+        self.backends = backends
+        self.notes_dir = notes_dir
+        self.index_dir = index_dir
+        self.embed_model = embed_model
+        self._chunks = []
+        self._matrix = None
+        self._signature = None
+        self._last_scan = 0
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+        if self.enabled:
+            os.makedirs(index_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.notes_dir)
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def _matrix_path(self):
+        return os.path.join(self.index_dir, 'embeddings.npy')
+
+    def _chunks_path(self):
+        return os.path.join(self.index_dir, 'chunks.json')
+
+    def _load(self):
+        try:
+            with open(self._chunks_path()) as f:
+                self._chunks = json.load(f)
+            self._matrix = np.load(self._matrix_path(), mmap_mode='r')
+        except (OSError, ValueError):
+            self._chunks, self._matrix = [], None
+
+        if self._matrix is not None and len(self._matrix) != len(self._chunks):
+            logger.warning("Notes index is inconsistent, rebuilding")
+            self._chunks, self._matrix = [], None
+        self._loaded = True
+
+    """Modification times and sizes of every note, used to detect changes"""
+    def _scan(self) -> list:
+        signature = []
+        for root, _, files in os.walk(self.notes_dir):
+            for name in sorted(files):
+                if name.endswith(NOTE_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    signature.append((path, stat.st_mtime, stat.st_size))
+        return sorted(signature)
+
+    """Chunk every note in a scan"""
+    def _read_chunks(self, signature: list) -> list:
+        chunks = []
+        for path, _, _ in signature:
+            with open(path, encoding='utf-8', errors='ignore') as f:
+                text = f.read()
+            source = os.path.relpath(path, self.notes_dir)
+            for chunk in chunk_text(text):
+                chunks.append({
+                    'hash': hashlib.sha1(chunk.encode()).hexdigest(),
+                    'source': source,
+                    'text': chunk
+                })
+        return chunks
+
+    """
+        Everything refresh reads from disk, run in one worker thread.
+
+        Returns:
+            tuple: The scan signature, and the chunks of every note or None if nothing changed.
+    """
+    def _collect(self, force: bool) -> tuple:
+        if not self._loaded:
+            self._load()
+
+        signature = self._scan()
+        if signature == self._signature and not force:
+            return signature, None
+        return signature, self._read_chunks(signature)
+
+    async def _embed(self, texts: list) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(texts), EMBED_BATCH):
+            payload = {"model": self.embed_model, "input": texts[start:start + EMBED_BATCH]}
+            status, data = await self.backends.post_json("/api/embed", payload, self.embed_model)
+            if status != 200:
+                raise RuntimeError(f"Embedding failed: {status} - {str(data)[:150]}")
+            vectors.extend(data['embeddings'])
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    """Re-embed changed notes if the notes folder changed since the last check"""
+    async def refresh(self, force: bool = False):
+        if not self.enabled:
+            return
+
+        now = time.monotonic()
+        if not force and now - self._last_scan < RESCAN_INTERVAL:
+            return
+        self._last_scan = now
+
+        async with self._lock:
+            signature, chunks = await asyncio.to_thread(self._collect, force)
+            if chunks is None:
+                return
+
+            # Reuse the embedding of any chunk seen before
+            known = {chunk['hash']: row for row, chunk in enumerate(self._chunks)}
+            new_chunks = [chunk for chunk in chunks if chunk['hash'] not in known]
+            if chunks != self._chunks:
+                new_vectors = await self._embed([chunk['text'] for chunk in new_chunks]) if new_chunks else None
+                # Swapped in on the loop, so a search never sees the new chunks with the old matrix
+                self._chunks, self._matrix = await asyncio.to_thread(self._write, chunks, known, new_chunks, new_vectors)
+                logger.info(f"Notes index updated: {len(chunks)} chunks, {len(new_chunks)} embedded")
+
+            self._signature = signature
+
+    """Save the index with the new embeddings and return its chunks and memory-mapped matrix"""
+    def _write(self, chunks, known, new_chunks, new_vectors) -> tuple:
+        if not chunks:
+            for path in (self._matrix_path(), self._chunks_path()):
+                if os.path.exists(path):
+                    os.remove(path)
+            return [], None
+
+        new_rows = {chunk['hash']: row for row, chunk in enumerate(new_chunks)}
+        dimensions = new_vectors.shape[1] if new_vectors is not None else self._matrix.shape[1]
+
+        # Copy kept rows from the old matrix and fill in the new ones, without a per-row loop
+        is_new = np.array([chunk['hash'] in new_rows for chunk in chunks])
+        matrix = np.empty((len(chunks), dimensions), dtype=np.float32)
+        if is_new.any():
+            matrix[is_new] = new_vectors[[new_rows[chunk['hash']] for chunk in chunks if chunk['hash'] in new_rows]]
+        if not is_new.all():
+            matrix[~is_new] = self._matrix[[known[chunk['hash']] for chunk in chunks if chunk['hash'] not in new_rows]]
+
+        temp_path = os.path.join(self.index_dir, 'embeddings.tmp.npy')
+        np.save(temp_path, matrix)
+        os.replace(temp_path, self._matrix_path())
+        with open(self._chunks_path(), 'w') as f:
+            json.dump(chunks, f)
+
+        return chunks, np.load(self._matrix_path(), mmap_mode='r')
+
+    """
+        Return the notes most relevant to a prompt.
+
+        Args:
+            prompt (str): The user's question.
+            k (int): Maximum number of chunks.
+
+        Returns:
+            list[dict]: The matching chunks (`source`, `text`), best first.
+    """
+    async def search(self, prompt: str, k: int = TOP_K) -> list:
+        if not self.enabled:
+            return []
+
+        await self.refresh()
+        if self._matrix is None or not len(self._chunks):
+            return []
+
+        query = (await self._embed([prompt]))[0]
+        scores = self._matrix @ query
+
+        k = min(k, len(scores))
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [self._chunks[row] for row in top if scores[row] >= MIN_SCORE]
@@ -0,0 +1,188 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+# Requests sent to each Ollama backend at the same time
+MAX_CONCURRENCY = int(os.getenv('OLLAMA_CONCURRENCY', 2))
+
+# Seconds a request may wait for a slot before it is dropped as stale
+QUEUE_TIMEOUT = float(os.getenv('OLLAMA_QUEUE_TIMEOUT', 120))
+
+# Lower values are served first
+PRIORITY_VOICE = 0
+PRIORITY_TEXT = 1
+
+
+"""Raised when a request waited `queue_timeout` seconds without getting a slot."""
+class QueueTimeout(Exception):
+    pass
+
+
+"""A request waiting for a slot."""
+class _Ticket:
+    __slots__ = ('guild_id', 'future', 'enqueued_at')
+
+    def __init__(self, guild_id, future):
+        self.guild_id = guild_id
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+"""A coalesced request shared by every caller with the same key."""
+class _SharedRequest:
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+"""
+Fair scheduler for requests to the Ollama server.
+
+At most `max_concurrency` requests run at once. Waiting requests are served
+by priority (voice before text) and, within a priority, round-robin between
+guilds, so one busy guild can't hold everyone else back. Identical requests
+in flight at the same time share one result, and requests whose callers were
+cancelled are dropped before they reach the server.
+
+Attributes:
+    max_concurrency (int): Maximum number of requests running at once.
+    queue_timeout (float): Seconds a request may wait before it is dropped.
+    active (int): Number of requests currently running.
+"""
+class RequestScheduler:
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, queue_timeout: float = QUEUE_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiting = {PRIORITY_VOICE: OrderedDict(), PRIORITY_TEXT: OrderedDict()}
+        self._shared = {}
+        self._depth = 0
+        self._wait_times = deque(maxlen=100)
+
+    """Number of requests waiting for a slot"""
+    @property
+    def queue_depth(self) -> int:
+        return self._depth
+
+    """Average seconds the last requests waited for a slot"""
+    @property
+    def average_wait(self) -> float:
+        return sum(self._wait_times) / len(self._wait_times) if self._wait_times else 0.0
+
+    """
+        Wait for a slot and hold it for the duration of the block.
+
+        Raises:
+            QueueTimeout: If no slot became free within `queue_timeout`. Timeouts
+                raised inside the block are not affected.
+    """
+    @asynccontextmanager
+    async def slot(self, guild_id=None, priority: int = PRIORITY_TEXT):
+        await self._acquire(guild_id, priority)
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._dispatch()
+
+    async def _acquire(self, guild_id, priority):
+        if self.active < self.max_concurrency and not self.queue_depth:
+            self.active += 1
+            self._wait_times.append(0.0)
+            return
+
+        ticket = _Ticket(guild_id, asyncio.get_running_loop().create_future())
+        self._waiting[priority].setdefault(guild_id, deque()).append(ticket)
+        self._depth += 1
+
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), timeout=self.queue_timeout)
+        except BaseException as e:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # The slot was granted just as the caller gave up, hand it on
+                self.active -= 1
+                self._dispatch()
+            else:
+                # Stale request: drop it before it ever reaches the server
+                ticket.future.cancel()
+                self._discard(priority, ticket)
+            if isinstance(e, asyncio.TimeoutError):
+                raise QueueTimeout(f"No slot free after {self.queue_timeout:.0f}s") from None
+            raise
+
+    def _discard(self, priority, ticket):
+        tickets = self._waiting[priority].get(ticket.guild_id)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            self._depth -= 1
+            if not tickets:
+                del self._waiting[priority][ticket.guild_id]
+
+    def _next_ticket(self):
+        for priority in sorted(self._waiting):
+            queues = self._waiting[priority]
+            while queues:
+                guild_id, tickets = next(iter(queues.items()))
+                ticket = tickets.popleft()
+                self._depth -= 1
+
+                # Round-robin: the guild goes to the back of the line
+                if tickets:
+                    queues.move_to_end(guild_id)
+                else:
+                    del queues[guild_id]
+
+                if not ticket.future.cancelled():
+                    return ticket
+        return None
+
+    def _dispatch(self):
+        while self.active < self.max_concurrency:
+            ticket = self._next_ticket()
+            if ticket is None:
+                return
+            self.active += 1
+            self._wait_times.append(time.monotonic() - ticket.enqueued_at)
+            ticket.future.set_result(None)
+
+    """
+        Run a request in a slot, sharing the result with identical requests in flight.
+
+        Args:
+            key: Identifies the request; callers with the same key share one run.
+            guild_id (int | None): The guild the request comes from.
+            priority (int): PRIORITY_VOICE or PRIORITY_TEXT.
+            factory: Called with no arguments to create the request coroutine.
+
+        Returns:
+            The result of the request.
+    """
+    async def run(self, key, guild_id, priority: int, factory):
+        shared = self._shared.get(key)
+
+        if shared is None:
+            async def request():
+                async with self.slot(guild_id, priority):
+                    return await factory()
+
+            shared = _SharedRequest(asyncio.create_task(request()))
+            self._shared[key] = shared
+            shared.task.add_done_callback(lambda _: self._forget(key, shared))
+
+        shared.waiters += 1
+        try:
+            return await asyncio.shield(shared.task)
+        finally:
+            shared.waiters -= 1
+            if shared.waiters == 0 and not shared.task.done():
+                # Every caller gave up, drop the request
+                self._forget(key, shared)
+                shared.task.cancel()
+
+    def _forget(self, key, shared):
+        if self._shared.get(key) is shared:
+            del self._shared[key]
@@ -0,0 +1,92 @@
+import os
+import time
+from collections import OrderedDict
+
+# Seconds without a new turn before a session is forgotten
+SESSION_IDLE_TIMEOUT = float(os.getenv('OLLAMA_SESSION_IDLE', 30 * 60))
+
+# Sessions whose context grows past this many tokens start over
+SESSION_MAX_CONTEXT = int(os.getenv('OLLAMA_SESSION_MAX_CONTEXT', 6000))
+
+# Maximum number of sessions kept at once
+MAX_SESSIONS = int(os.getenv('OLLAMA_MAX_SESSIONS', 200))
+
+
+"""
+Conversation state for one channel.
+
+Holds the token context Ollama returned for the last turn, so the next turn
+only sends the new user message instead of the whole system prompt and history.
+
+Attributes:
+    key: The session key (channel ID and mode).
+    context (list[int] | None): The context returned by the last turn.
+    turns (int): Number of completed turns.
+    last_used (float): Monotonic time of the last turn.
+"""
+class ConversationSession:
+    def __init__(self, key, max_context: int = SESSION_MAX_CONTEXT):
+        self.key = key
+        self.max_context = max_context
+        self.context = None
+        self.turns = 0
+        self.last_used = time.monotonic()
+
+    """Store the context returned for a completed turn"""
+    def update(self, context: list):
+        self.last_used = time.monotonic()
+        if not context:
+            return
+
+        if len(context) > self.max_context:
+            # Too long to keep extending, the next turn starts a fresh conversation
+            self.reset()
+            return
+
+        self.context = context
+        self.turns += 1
+
+    """Forget the conversation so far"""
+    def reset(self):
+        self.context = None
+        self.turns = 0
+
+
+"""
+Conversation sessions keyed by channel, evicted when idle.
+
+Attributes:
+    idle_timeout (float): Seconds of inactivity before a session is dropped.
+    max_sessions (int): Maximum number of sessions kept.
+"""
+class SessionStore:
+    def __init__(self, idle_timeout: float = SESSION_IDLE_TIMEOUT, max_sessions: int = MAX_SESSIONS):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    """Return the session for a key, creating it if needed"""
+    def get(self, key) -> ConversationSession:
+        self._evict()
+
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = ConversationSession(key)
+        self._sessions.move_to_end(key)
+        return session
+
+    """Forget every session of a channel"""
+    def reset_channel(self, channel_id: int):
+        for key in [key for key in self._sessions if key[0] == channel_id]:
+            del self._sessions[key]
+
+    def _evict(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if session.last_used > cutoff and len(self._sessions) < self.max_sessions:
+                break
+            del self._sessions[key]
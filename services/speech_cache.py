@@ -0,0 +1,182 @@
+import os
+import re
+import json
+import struct
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Memory budget for cached speech (bytes of Opus packets)
+MAX_BYTES = int(os.getenv('TTS_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+# Folder where speech evicted from memory is kept, and its size budget
+CACHE_DIR = os.getenv('TTS_CACHE_DIR', '.tts_cache')
+DISK_MAX_BYTES = int(os.getenv('TTS_CACHE_DISK_MAX_BYTES', 256 * 1024 * 1024))
+
+# Packets are stored on disk with a 2-byte length prefix
+_LENGTH = struct.Struct('>H')
+
+
+"""Total size of a list of Opus packets"""
+def frames_size(frames: list) -> int:
+    return sum(len(frame) for frame in frames)
+
+
+"""
+Content-addressed cache of synthesized speech, stored as ready-to-play Opus packets.
+
+Entries are keyed by the text and voice settings. The most recently used ones
+stay in memory within a byte budget; entries pushed out of memory are written
+to disk and loaded back on the next hit. Concurrent requests for the same
+phrase share a single synthesis.
+
+Attributes:
+    max_bytes (int): Memory budget in bytes.
+    directory (str | None): Folder for entries evicted from memory, None to disable the disk tier.
+    disk_max_bytes (int): Disk budget in bytes.
+"""
+class SpeechCache:
+    def __init__(self, max_bytes: int = MAX_BYTES, directory: str = CACHE_DIR, disk_max_bytes: int = DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    """Cache key for a phrase spoken with the given voice settings"""
+    @staticmethod
+    def key(text: str, lang: str, **voice) -> str:
+        text = re.sub(r'\s+', ' ', text.strip())
+        raw = json.dumps([text, lang, voice], sort_keys=True)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    """
+        Return the cached packets for a key, synthesizing them on a miss.
+
+        Args:
+            key (str): The cache key.
+            factory: Called with no arguments to create a coroutine returning the packets,
+                or None if synthesis failed (failures aren't cached).
+
+        Returns:
+            list[bytes] | None: The Opus packets.
+    """
+    async def get_or_create(self, key: str, factory):
+        frames = self._get(key)
+        if frames is not None:
+            self.hits += 1
+            return frames
+
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._create(key, factory))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+
+        # The synthesis finishes and is cached even if this caller gives up
+        return await asyncio.shield(task)
+
+    async def _create(self, key, factory):
+        frames = await asyncio.to_thread(self._load, key) if self.directory else None
+        if frames is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            frames = await factory()
+            if not frames:
+                return None
+
+        evicted = self._put(key, frames)
+        if evicted and self.directory:
+            await asyncio.to_thread(self._spill, evicted)
+        return frames
+
+    def _get(self, key):
+        frames = self._entries.get(key)
+        if frames is not None:
+            self._entries.move_to_end(key)
+        return frames
+
+    """Store packets in memory, returning the entries evicted to make room"""
+    def _put(self, key, frames):
+        if key in self._entries:
+            self._size -= frames_size(self._entries.pop(key))
+        self._entries[key] = frames
+        self._size += frames_size(frames)
+
+        evicted = []
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            old_key, old_frames = self._entries.popitem(last=False)
+            self._size -= frames_size(old_frames)
+            evicted.append((old_key, old_frames))
+        return evicted
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.opus")
+
+    def _load(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        frames = []
+        offset = 0
+        while offset < len(data):
+            (length,) = _LENGTH.unpack_from(data, offset)
+            offset += _LENGTH.size
+            frames.append(data[offset:offset + length])
+            offset += length
+
+        # Touch the file so the disk tier evicts least recently used entries first
+        os.utime(self._path(key))
+        return frames
+
+    def _spill(self, entries):
+        # Created on the first spill, so a cache that fits in memory leaves nothing on disk
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"Could not create speech cache folder: {e}")
+            return
+
+        for key, frames in entries:
+            path = self._path(key)
+            if os.path.exists(path):
+                continue
+            try:
+                with open(f"{path}.part", 'wb') as f:
+                    for frame in frames:
+                        f.write(_LENGTH.pack(len(frame)))
+                        f.write(frame)
+                os.replace(f"{path}.part", path)
+            except OSError as e:
+                logger.warning(f"Could not write speech cache entry: {e}")
+        self._trim_disk()
+
+    def _trim_disk(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.opus'):
+                stat = os.stat(os.path.join(self.directory, name))
+                files.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+                total -= size
+            except OSError:
+                pass
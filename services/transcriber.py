@@ -0,0 +1,267 @@
+import os
+import time
+import queue
+import asyncio
+import itertools
+import threading
+import multiprocessing
+from collections import deque
+
+# Whisper model and device ('cuda', 'cpu', or unset to pick automatically)
+MODEL_NAME = os.getenv('WHISPER_MODEL', 'base')
+DEVICE = os.getenv('WHISPER_DEVICE')
+
+# Utterances decoded together, and how long the worker waits to fill a batch
+BATCH_SIZE = int(os.getenv('TRANSCRIBE_BATCH_SIZE', 8))
+BATCH_WAIT = 0.05
+
+# Utterances waiting at once before new ones are rejected, and the age after which they're dropped
+MAX_PENDING = int(os.getenv('TRANSCRIBE_MAX_PENDING', 32))
+MAX_AGE = float(os.getenv('TRANSCRIBE_MAX_AGE', 10))
+
+# Seconds a caller waits for its transcription before giving up on it
+RESULT_TIMEOUT = float(os.getenv('TRANSCRIBE_TIMEOUT', 60))
+
+# Seconds before a worker that died (or failed to load the model) is started again
+RESTART_DELAY = 30
+
+# How often the result reader checks that the worker is still alive
+POLL_SECONDS = 1.0
+
+# Whisper works on 30 second windows; shorter utterances can share a batch
+WINDOW_SECONDS = 30
+SAMPLE_RATE = 16000
+
+
+"""
+Entry point of the worker process: load the model once, then transcribe batches until told to stop.
+
+Requests are (request_id, audio, language, submitted_at) tuples and results
+are (request_id, text, error, batch_size) tuples; a None request stops the worker.
+The worker reports 'ready' once the model is loaded, or 'error' if it can't be.
+"""
+def _worker_main(model_name, device, requests, results, batch_size, max_age):
+    import torch
+    import whisper
+
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    try:
+        model = whisper.load_model(model_name, device=device)
+    except Exception as e:
+        results.put(('error', None, f"Could not load Whisper model {model_name}: {e}", 0))
+        return
+    fp16 = device == "cuda"
+    results.put(('ready', None, None, 0))
+
+    while True:
+        batch = [requests.get()]
+        if batch[0] is None:
+            return
+
+        # Give other utterances a moment to arrive so they are decoded together
+        deadline = time.monotonic() + BATCH_WAIT
+        while len(batch) < batch_size:
+            try:
+                item = requests.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                requests.put(None)
+                break
+            batch.append(item)
+
+        fresh = []
+        for request_id, audio, language, submitted_at in batch:
+            if time.time() - submitted_at > max_age:
+                # Too old to be useful as a caption, don't spend time on it
+                results.put((request_id, None, 'stale', 0))
+            else:
+                fresh.append((request_id, audio, language))
+
+        # Utterances that fit in one window are decoded as a batch per language
+        by_language = {}
+        for request_id, audio, language in fresh:
+            if len(audio) <= WINDOW_SECONDS * SAMPLE_RATE:
+                by_language.setdefault(language, []).append((request_id, audio))
+            else:
+                try:
+                    text = model.transcribe(audio, language=language, fp16=fp16)['text']
+                    results.put((request_id, text, None, 1))
+                except Exception as e:
+                    results.put((request_id, None, str(e), 1))
+
+        for language, items in by_language.items():
+            try:
+                mels = torch.stack([
+                    whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(audio)), model.dims.n_mels)
+                    for _, audio in items
+                ]).to(model.device)
+                options = whisper.DecodingOptions(language=language, fp16=fp16, without_timestamps=True)
+                decoded = whisper.decode(model, mels, options)
+                for (request_id, _), result in zip(items, decoded):
+                    results.put((request_id, result.text, None, len(items)))
+            except Exception as e:
+                for request_id, _ in items:
+                    results.put((request_id, None, str(e), len(items)))
+
+
+"""
+Whisper transcription in a dedicated worker process shared by every speaker and guild.
+
+The model is loaded once, in the worker, so the bot process never imports
+torch. Utterances are sent through a queue and decoded in batches. When the
+worker falls behind, new utterances are rejected once `max_pending` are
+waiting, and utterances older than `max_age` are dropped instead of decoded.
+If the worker dies, waiting utterances are dropped and a new worker is
+started, at most once every RESTART_DELAY seconds.
+
+Attributes:
+    latencies (deque): Seconds from submission to result for recent utterances.
+    dropped (int): Utterances rejected or dropped as stale.
+"""
+class Transcriber:
+    def __init__(self, model_name: str = MODEL_NAME, device: str = DEVICE, batch_size: int = BATCH_SIZE,
+                 max_pending: int = MAX_PENDING, max_age: float = MAX_AGE):
+        self.model_name = model_name
+        self.device = device
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self.latencies = deque(maxlen=100)
+        self.dropped = 0
+        self.ready = threading.Event()
+        self._context = multiprocessing.get_context('spawn')
+        self._process = None
+        self._requests = None
+        self._results = None
+        # Guards _pending, which the result thread and the event loop both update
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._ids = itertools.count()
+        self._restart_at = 0.0
+
+    """Average latency of recent utterances, in seconds"""
+    @property
+    def average_latency(self) -> float:
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+    """
+        Start the worker process if it isn't running.
+
+        Returns:
+            bool: False if the worker recently died and is waiting to be restarted.
+    """
+    def start(self) -> bool:
+        if self._process and self._process.is_alive():
+            return True
+        if time.monotonic() < self._restart_at:
+            return False
+
+        self.ready.clear()
+        self._requests = self._context.Queue()
+        self._results = self._context.Queue()
+        self._process = self._context.Process(
+            target=_worker_main,
+            args=(self.model_name, self.device, self._requests, self._results, self.batch_size, self.max_age),
+            daemon=True
+        )
+        self._process.start()
+        threading.Thread(target=self._read_results, args=(self._process, self._results), daemon=True).start()
+        return True
+
+    def stop(self):
+        process, self._process = self._process, None
+        if process and process.is_alive():
+            self._requests.put(None)
+            process.join(timeout=5)
+        self._fail_pending()
+
+    # Resolve every waiting caller with None, from any thread
+    def _fail_pending(self):
+        with self._lock:
+            entries = list(self._pending.values())
+            self._pending.clear()
+        for future, _ in entries:
+            future.get_loop().call_soon_threadsafe(self._resolve, future, None)
+
+    """
+        Transcribe an utterance.
+
+        Args:
+            audio (np.ndarray): Mono float32 audio at 16 kHz.
+            language (str): The spoken language.
+
+        Returns:
+            dict | None: `text`, `latency` (seconds) and `batch` (utterances decoded together),
+                or None if the utterance was dropped because the worker is overloaded.
+    """
+    async def transcribe(self, audio, language: str = 'pt'):
+        if not self.start():
+            self.dropped += 1
+            return None
+
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        submitted_at = time.time()
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return None
+            self._pending[request_id] = (future, submitted_at)
+        try:
+            self._requests.put((request_id, audio, language, submitted_at))
+            return await asyncio.wait_for(future, timeout=RESULT_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            return None
+        finally:
+            with self._lock:
+                self._pending.pop(request_id, None)
+
+    # Runs in a background thread, handing results back to the waiting event loops
+    def _read_results(self, process, results):
+        while True:
+            try:
+                request_id, text, error, batch = results.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                if process.is_alive():
+                    continue
+                if process is self._process:
+                    # Crashed or was killed (e.g. out of memory), nothing will answer the waiting callers
+                    print(f"Transcription worker exited with code {process.exitcode}, restarting in {RESTART_DELAY}s")
+                    self._restart_at = time.monotonic() + RESTART_DELAY
+                    self._fail_pending()
+                return
+            except (EOFError, OSError):
+                return
+
+            if request_id == 'ready':
+                self.ready.set()
+                continue
+            if request_id == 'error':
+                # The worker exits after this, which is handled above
+                print(f"Transcription worker failed: {error}")
+                continue
+
+            with self._lock:
+                entry = self._pending.get(request_id)
+            if entry is None:
+                continue
+            future, submitted_at = entry
+
+            if error:
+                if error == 'stale':
+                    self.dropped += 1
+                else:
+                    print(f"Transcription error: {error}")
+                result = None
+            else:
+                latency = time.time() - submitted_at
+                self.latencies.append(latency)
+                result = {'text': text, 'latency': latency, 'batch': batch}
+            future.get_loop().call_soon_threadsafe(self._resolve, future, result)
+
+    @staticmethod
+    def _resolve(future, result):
+        if not future.done():
+            future.set_result(result)
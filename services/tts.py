@@ -1,53 +1,174 @@
 import discord
-from gtts import gTTS
-import os
-import tempfile
+import io
+import importlib
 import asyncio
-from pydub import AudioSegment
-from discord import FFmpegPCMAudio
-from discord.ext import commands
+from collections import deque
+from utils.sentence_splitter import SentenceSplitter
+from services.speech_cache import SpeechCache
+from services.voice_output import output_for, PRIORITY_SPEECH
+from utils import metrics
 
+# Sentences synthesized at the same time while streaming speech
+SYNTHESIS_CONCURRENCY = 3
+
+# Discord voice plays 48 kHz stereo 16-bit PCM
+SAMPLE_RATE = 48000
+CHANNELS = 2
+
+# 20 ms of PCM, the frame size Discord expects
+FRAME_SIZE = 3840
+
+# Opus bitrate for speech (kbps)
+SPEECH_BITRATE = 64
+
+# A single Opus packet of silence
+OPUS_SILENCE = b'\xf8\xff\xfe'
+
+SYNTHESIS_SECONDS = metrics.histogram('tts_synthesis_seconds', "Time to synthesize and decode one phrase")
+
+
+"""
+Encode 48 kHz stereo 16-bit PCM into 20 ms Opus packets.
+
+Args:
+    pcm (bytes): The audio; a trailing partial frame is padded with silence.
+
+Returns:
+    list[bytes]: One Opus packet per frame.
+"""
+def encode_opus(pcm: bytes) -> list:
+    encoder = discord.opus.Encoder()
+    encoder.set_bitrate(SPEECH_BITRATE)
+
+    if len(pcm) % FRAME_SIZE:
+        pcm += b'\x00' * (FRAME_SIZE - len(pcm) % FRAME_SIZE)
+    return [
+        encoder.encode(pcm[offset:offset + FRAME_SIZE], encoder.SAMPLES_PER_FRAME)
+        for offset in range(0, len(pcm), FRAME_SIZE)
+    ]
+
+
+"""
+Audio source fed with Opus packets while it plays.
+
+Packets are appended with `feed` as they become available; while none are
+waiting, silence is returned so playback continues seamlessly until `close`
+is called and the remaining packets have been played. Discord sends the
+packets as they are, without transcoding.
+"""
+class OpusStreamSource(discord.AudioSource):
+    def __init__(self):
+        self._frames = deque()
+        self._closed = False
+
+    """Append Opus packets to the stream"""
+    def feed(self, frames: list):
+        self._frames.extend(frames)
+
+    """Mark the stream as complete, playback ends once every packet was played"""
+    def close(self):
+        self._closed = True
+
+    def read(self) -> bytes:
+        try:
+            return self._frames.popleft()
+        except IndexError:
+            return b'' if self._closed else OPUS_SILENCE
+
+    def is_opus(self) -> bool:
+        return True
+
+    def cleanup(self):
+        self._closed = True
+        self._frames.clear()
+
+
+"""
+Text-to-speech using gTTS.
+
+Synthesis runs in a worker thread and the MP3 is decoded by FFmpeg through
+pipes straight to 48 kHz stereo PCM, so audio never touches the disk and the
+event loop never blocks while a sentence is being synthesized. The result is
+encoded to Opus once and cached, so repeated phrases play right away.
+"""
 class TTSService():
     def __init__(self):
-        self.temp_files = []
+        self._decoders = set()
+        self.cache = SpeechCache()
 
-    """Generate speech audio from text and return file path."""
-    async def generate_speech(self, text: str, lang: str = 'en') -> str:
-        
+        metrics.counter('tts_cache_hits_total', "Phrases served from the speech cache").set_function(lambda: self.cache.hits)
+        metrics.counter('tts_cache_misses_total', "Phrases that had to be synthesized").set_function(lambda: self.cache.misses)
+
+    """
+        Synthesize speech to Opus packets, reusing cached audio for phrases spoken before.
+
+        Returns:
+            list[bytes] | None: The packets, or None if synthesis failed.
+    """
+    async def synthesize_opus(self, text: str, lang: str = 'en') -> list:
+        key = self.cache.key(text, lang, slow=False, bitrate=SPEECH_BITRATE)
+        return await self.cache.get_or_create(key, lambda: self._synthesize_opus(text, lang))
+
+    async def _synthesize_opus(self, text, lang):
+        pcm = await self.synthesize_pcm(text, lang)
+        if not pcm:
+            return None
+        return await asyncio.to_thread(encode_opus, pcm)
+
+    """Synthesize speech to 48 kHz stereo 16-bit PCM in memory, off the event loop."""
+    async def synthesize_pcm(self, text: str, lang: str = 'en') -> bytes:
         try:
-            # Generate speech with gTTS
-            tts = gTTS(text=text, lang=lang, slow=False)
-            
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as mp3_file:
-                tts.save(mp3_file.name)
-
-            # Convert to PCM format for Discord
-            wav_path = mp3_file.name.replace(".mp3", ".wav")
-            sound = AudioSegment.from_file(mp3_file.name, format="mp3")
-            sound.export(wav_path, format="wav")
-
-            # Store for cleanup
-            self.temp_files.append(mp3_file.name)
-            self.temp_files.append(wav_path)
-
-            return wav_path
-            
+            with SYNTHESIS_SECONDS.time():
+                mp3 = await asyncio.to_thread(self._synthesize_mp3, text, lang)
+                return await self._decode(mp3)
         except Exception as e:
             print(f"TTS Error: {str(e)}")
             return None
 
-    
-    """Clean up temporary files"""
-    def cleanup(self):
-        
-        for file in self.temp_files:
-            try:
-                if os.path.exists(file):
-                    os.remove(file)
-            except:
-                pass
-        self.temp_files = []
+    @staticmethod
+    def _synthesize_mp3(text: str, lang: str) -> bytes:
+        # Imported on first use to keep startup fast, see warm_up
+        from gtts import gTTS
+
+        mp3 = io.BytesIO()
+        gTTS(text=text, lang=lang, slow=False).write_to_fp(mp3)
+        return mp3.getvalue()
+
+    """Decode audio to raw PCM with FFmpeg, reading from stdin and writing to stdout"""
+    async def _decode(self, data: bytes) -> bytes:
+        process = await asyncio.create_subprocess_exec(
+            'ffmpeg', '-hide_banner', '-loglevel', 'error',
+            '-i', 'pipe:0',
+            '-f', 's16le', '-ar', str(SAMPLE_RATE), '-ac', str(CHANNELS), 'pipe:1',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        self._decoders.add(process)
+        try:
+            pcm, error = await process.communicate(data)
+        finally:
+            self._decoders.discard(process)
+
+        if process.returncode != 0:
+            raise RuntimeError(f"FFmpeg failed: {error.decode(errors='ignore')[:200]}")
+        return pcm
+
+
+    """Load gTTS and the Opus library in the background before the first utterance"""
+    async def warm_up(self):
+        await asyncio.to_thread(importlib.import_module, 'gtts')
+        if not discord.opus.is_loaded():
+            # Creating an encoder loads libopus
+            await asyncio.to_thread(discord.opus.Encoder)
+
+
+    """Stop any decoders still running"""
+    async def cleanup(self):
+        for process in list(self._decoders):
+            if process.returncode is None:
+                process.kill()
+        self._decoders.clear()
 
 
     """Convert text to speech and play it"""
@@ -65,18 +186,83 @@ class TTSService():
             await voice_channel.connect()
 
         # Generate speech
-        wav_path = await self.generate_speech(text)
-        if not wav_path:
+        frames = await self.synthesize_opus(text)
+        if not frames:
             return await ctx.send("❌ Failed to generate speech")
 
-        while ctx.voice_client.is_playing():
-            await asyncio.sleep(1)
-
-        # Play audio
-        source = FFmpegPCMAudio(wav_path)
-        ctx.voice_client.play(
-            source,
-            after=lambda e: self.cleanup() if e else None
-        )
+        # Play the encoded packets straight from memory
+        source = OpusStreamSource()
+        source.feed(frames)
+        source.close()
+        output_for(ctx.voice_client).play(source, PRIORITY_SPEECH)
 
         await ctx.send(f"🔊 **Speaking**: {text}")
+
+
+    """
+        Speak streamed text sentence by sentence while it is still being generated.
+
+        Each completed sentence is synthesized concurrently with the others and fed,
+        in order, into one continuous playback, so the first sentence is heard while
+        later ones are still being generated. Returns the full text that was spoken.
+    """
+    async def speak_stream(self, ctx, chunks, lang: str = 'en') -> str:
+
+        voice_channel = ctx.author.voice.channel
+
+        if ctx.voice_client:
+            if ctx.voice_client.channel != voice_channel:
+                await ctx.voice_client.move_to(voice_channel)
+        else:
+            await voice_channel.connect()
+
+        splitter = SentenceSplitter()
+        source = OpusStreamSource()
+        syntheses = asyncio.Queue()
+        slots = asyncio.Semaphore(SYNTHESIS_CONCURRENCY)
+        tasks = []
+        text = []
+
+        async def synthesize(sentence):
+            async with slots:
+                return await self.synthesize_opus(sentence, lang)
+
+        def schedule(sentence):
+            task = asyncio.create_task(synthesize(sentence))
+            tasks.append(task)
+            syntheses.put_nowait(task)
+
+        # Feed synthesized sentences into the source in the order they were generated
+        async def play_in_order():
+            started = False
+            while (task := await syntheses.get()) is not None:
+                frames = await task
+                if not frames:
+                    continue
+                source.feed(frames)
+                if not started:
+                    output_for(ctx.voice_client).play(source, PRIORITY_SPEECH)
+                    started = True
+            source.close()
+
+        player = asyncio.create_task(play_in_order())
+        try:
+            async for chunk in chunks:
+                text.append(chunk)
+                for sentence in splitter.feed(chunk):
+                    schedule(sentence)
+
+            for sentence in splitter.flush():
+                schedule(sentence)
+        finally:
+            syntheses.put_nowait(None)
+            try:
+                await player
+            finally:
+                # Sentences the player never reached, because it or the reply failed
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                source.close()
+
+        return ''.join(text)
@@ -0,0 +1,311 @@
+import os
+import heapq
+import asyncio
+import itertools
+import threading
+import discord
+from utils.audio_mixer import DuckingMixer
+
+# Lower values play first
+PRIORITY_SPEECH = 0
+PRIORITY_MUSIC = 1
+
+# 'duck' plays speech over the current song at a lower volume, 'preempt' pauses the song
+# while speech plays, 'queue' lets speech wait for the song to end
+SPEECH_POLICY = os.getenv('VOICE_SPEECH_POLICY', 'duck')
+
+
+"""
+An audio source waiting for, or using, a guild's voice output.
+
+Attributes:
+    source (discord.AudioSource): The audio to play.
+    priority (int): PRIORITY_SPEECH or PRIORITY_MUSIC.
+    done (asyncio.Event): Set once the item finished playing or was cancelled.
+    error (Exception | None): The error that ended playback, if any.
+"""
+class VoiceItem:
+    def __init__(self, source, priority, after, sequence):
+        self.source = source
+        self.priority = priority
+        self.after = after
+        self.done = asyncio.Event()
+        self.error = None
+        self.cancelled = False
+        self.decoder = None
+        self.entry = (priority, sequence, self)
+
+    @property
+    def finished(self) -> bool:
+        return self.done.is_set()
+
+    """Wait until the item finished playing"""
+    async def wait(self):
+        await self.done.wait()
+
+    def _finish(self, error):
+        if self.done.is_set():
+            return
+        self.error = error
+        self.done.set()
+        if self.after:
+            self.after(error)
+
+
+"""
+The single audio source given to the voice client, reading from the current item.
+
+When an item runs out, the next one is picked up within the same read, so
+there is no gap between songs and speech. An empty read ends playback until
+something new is queued.
+"""
+class _OutputSource(discord.AudioSource):
+    def __init__(self, output):
+        self.output = output
+
+    def read(self) -> bytes:
+        return self.output._read()
+
+    def is_opus(self) -> bool:
+        return True
+
+
+"""
+Owns playback on one guild's voice client.
+
+Music and speech are queued here instead of calling `voice_client.play`
+directly. Items play one at a time in priority order, speech first. With the
+'duck' policy, queued speech is mixed over the current song while the song's
+volume is lowered; with 'preempt', speech pauses the song and it resumes
+where it left off afterwards. Completion is reported through each item's
+`done` event and `after` callback, both on the event loop.
+
+Opus packets are passed through untouched except while the mixer is active,
+when both streams are decoded to PCM, mixed and encoded again.
+
+Attributes:
+    voice_client (discord.VoiceClient): The voice connection.
+    policy (str): 'duck', 'preempt' or 'queue'.
+"""
+class VoiceOutput:
+    def __init__(self, voice_client, policy: str = SPEECH_POLICY):
+        self.voice_client = voice_client
+        self.policy = policy
+        self.loop = voice_client.loop
+        self._source = _OutputSource(self)
+        self._lock = threading.Lock()
+        self._heap = []
+        self._current = None
+        self._overlay = None
+        self._mixer = DuckingMixer()
+        self._encoder = None
+        self._running = False
+        self._sequence = itertools.count()
+        self._disconnect = None
+
+    """Check whether anything is playing or waiting to play"""
+    @property
+    def busy(self) -> bool:
+        return self._current is not None or self._overlay is not None or bool(self._heap)
+
+    """
+        Queue an audio source for playback.
+
+        Args:
+            source (discord.AudioSource): The audio, Opus or PCM.
+            priority (int): PRIORITY_SPEECH or PRIORITY_MUSIC.
+            after: Called on the event loop with the error (or None) once the item finished.
+
+        Returns:
+            VoiceItem: The queued item.
+    """
+    def play(self, source, priority: int = PRIORITY_MUSIC, after=None) -> VoiceItem:
+        if priority == PRIORITY_MUSIC:
+            # Music is back, the music state decides again when to leave
+            self.cancel_disconnect()
+        item = VoiceItem(source, priority, after, next(self._sequence))
+        with self._lock:
+            heapq.heappush(self._heap, item.entry)
+        self._kick()
+        return item
+
+    """Stop an item, whether it is playing or still waiting"""
+    def cancel(self, item: VoiceItem):
+        with self._lock:
+            if item is self._current or item is self._overlay:
+                # The audio thread finishes it on its next read
+                item.cancelled = True
+                return
+            if item.entry not in self._heap:
+                return
+            self._heap.remove(item.entry)
+            heapq.heapify(self._heap)
+
+        item.source.cleanup()
+        item._finish(None)
+
+    """Drop every item, e.g. when the voice connection goes away"""
+    def close(self, error=None):
+        with self._lock:
+            items = [entry[2] for entry in self._heap]
+            items += [item for item in (self._current, self._overlay) if item]
+            self._heap.clear()
+            self._current = self._overlay = None
+
+        for item in items:
+            item.source.cleanup()
+            item._finish(error)
+
+    """
+        Disconnect once nothing is playing or waiting, so speech still queued isn't cut off.
+
+        Safe to call from any thread. Queuing music cancels the disconnect.
+    """
+    def disconnect_when_idle(self):
+        self.cancel_disconnect()
+        self._disconnect = asyncio.run_coroutine_threadsafe(self._disconnect_when_idle(), self.loop)
+
+    def cancel_disconnect(self):
+        if self._disconnect:
+            self._disconnect.cancel()
+            self._disconnect = None
+
+    async def _disconnect_when_idle(self):
+        while True:
+            with self._lock:
+                items = [entry[2] for entry in self._heap]
+                items += [item for item in (self._current, self._overlay) if item]
+            if not items:
+                break
+            await asyncio.gather(*(item.wait() for item in items))
+        await self.voice_client.disconnect()
+
+    def _kick(self):
+        if self._running or not self.busy:
+            return
+
+        try:
+            self.voice_client.play(
+                self._source,
+                after=lambda e: self.loop.call_soon_threadsafe(self._on_stopped, e)
+            )
+            self._running = True
+        except discord.ClientException as e:
+            self.close(e)
+
+    def _on_stopped(self, error):
+        self._running = False
+        if error:
+            print(f"Voice output error: {error}")
+        self._kick()
+
+    # Everything below runs in the voice client's audio thread
+
+    def _next_items(self):
+        with self._lock:
+            current, overlay = self._current, self._overlay
+            if current is None and overlay is not None:
+                # The song ended while speech played over it
+                current, overlay = overlay, None
+
+            if (current and self._heap and self.policy == 'preempt'
+                    and self._heap[0][0] < current.priority):
+                # Put the current item back, it resumes once the higher priority items are done
+                heapq.heappush(self._heap, current.entry)
+                current = None
+
+            if current is None and self._heap:
+                current = heapq.heappop(self._heap)[2]
+
+            if (overlay is None and current and self._heap and self.policy == 'duck'
+                    and self._heap[0][0] < current.priority):
+                overlay = heapq.heappop(self._heap)[2]
+
+            self._current, self._overlay = current, overlay
+            return current, overlay
+
+    def _read(self) -> bytes:
+        while True:
+            item, overlay = self._next_items()
+            if item is None:
+                return b''
+            if item.priority != PRIORITY_MUSIC:
+                # Only music is ducked, speech always plays at full volume
+                self._mixer.reset()
+
+            if overlay is None and self._mixer.idle:
+                # Nothing to mix, pass the packets straight through
+                item.decoder = None
+                frame = self._read_item(item, pcm=False)
+                if frame is None:
+                    continue
+                return frame if item.source.is_opus() else self._encode(frame)
+
+            music = self._read_item(item, pcm=True)
+            speech = self._read_item(overlay, pcm=True) if overlay else None
+            if music is None and speech is None:
+                continue
+            return self._encode(self._mixer.mix(music, speech))
+
+    """Read the next frame of an item, as PCM or as it comes; None once the item ended"""
+    def _read_item(self, item, pcm):
+        try:
+            frame = b'' if item.cancelled else item.source.read()
+            if frame and pcm and item.source.is_opus():
+                if item.decoder is None:
+                    item.decoder = discord.opus.Decoder()
+                frame = item.decoder.decode(frame)
+        except Exception as e:
+            self._end_item(item, e)
+            return None
+
+        if not frame:
+            self._end_item(item, None)
+            return None
+        return frame
+
+    def _encode(self, pcm):
+        if self._encoder is None:
+            self._encoder = discord.opus.Encoder()
+        return self._encoder.encode(pcm, self._encoder.SAMPLES_PER_FRAME)
+
+    def _end_item(self, item, error):
+        with self._lock:
+            if self._current is item:
+                self._current = None
+            if self._overlay is item:
+                self._overlay = None
+        item.source.cleanup()
+        self.loop.call_soon_threadsafe(item._finish, error)
+
+
+_outputs = {}
+
+"""
+Return the voice output for a voice client's guild, replacing it if the client changed.
+
+Args:
+    voice_client (discord.VoiceClient): The guild's current voice connection.
+
+Returns:
+    VoiceOutput: The output that owns playback on that connection.
+"""
+def output_for(voice_client) -> VoiceOutput:
+    output = _outputs.get(voice_client.guild.id)
+    if output is None or output.voice_client is not voice_client:
+        if output:
+            output.close()
+        output = _outputs[voice_client.guild.id] = VoiceOutput(voice_client)
+    return output
+
+
+"""
+Forget a guild's voice output once its voice connection is gone, dropping anything still queued.
+
+Args:
+    guild_id (int): The guild that left voice.
+"""
+def release_output(guild_id: int):
+    output = _outputs.pop(guild_id, None)
+    if output:
+        output.close()
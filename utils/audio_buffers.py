@@ -0,0 +1,86 @@
+import threading
+import numpy as np
+
+
+"""
+Fixed-size ring buffer of 16-bit PCM samples with contiguous, zero-copy reads.
+
+Storage is allocated once. Every sample is written twice, at its position
+and one capacity further, so any run of buffered samples can be returned as
+a single contiguous NumPy view, even when it wraps around the end of the
+ring. When the buffer is full, the oldest samples are overwritten, which
+caps the memory used per speaker.
+
+Writes come from the voice receive thread and reads from the event loop, so
+the indices are guarded by a lock. A view stays valid until it is consumed,
+as long as the buffer doesn't overflow in the meantime.
+
+Attributes:
+    capacity (int): Maximum number of samples held.
+    dropped (int): Samples discarded because the buffer was full.
+"""
+class PCMRingBuffer:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.dropped = 0
+        self._data = np.zeros(capacity * 2, dtype=np.int16)
+        self._start = 0
+        self._length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._length
+
+    """Append 16-bit PCM, dropping the oldest samples if it doesn't fit"""
+    def write(self, pcm: bytes):
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        if len(samples) > self.capacity:
+            self.dropped += len(samples) - self.capacity
+            samples = samples[-self.capacity:]
+
+        with self._lock:
+            overflow = self._length + len(samples) - self.capacity
+            if overflow > 0:
+                self._start = (self._start + overflow) % self.capacity
+                self._length -= overflow
+                self.dropped += overflow
+
+            end = (self._start + self._length) % self.capacity
+            self._copy_in(end, samples)
+            self._length += len(samples)
+
+    def _copy_in(self, position, samples):
+        # Write to the ring and to its mirror, splitting where the mirror wraps
+        first = min(len(samples), self.capacity * 2 - (position + self.capacity))
+        self._data[position:position + len(samples)] = samples
+        self._data[position + self.capacity:position + self.capacity + first] = samples[:first]
+        if first < len(samples):
+            self._data[:len(samples) - first] = samples[first:]
+
+    """
+        Return buffered samples without copying or removing them.
+
+        Args:
+            count (int | None): Maximum number of samples, all of them by default.
+
+        Returns:
+            np.ndarray: A read-only int16 view of the oldest samples.
+    """
+    def window(self, count: int = None) -> np.ndarray:
+        with self._lock:
+            count = self._length if count is None else min(count, self._length)
+            view = self._data[self._start:self._start + count]
+        view.flags.writeable = False
+        return view
+
+    """Drop the oldest `count` samples, typically after processing a window"""
+    def consume(self, count: int):
+        with self._lock:
+            count = min(count, self._length)
+            self._start = (self._start + count) % self.capacity
+            self._length -= count
+
+    def clear(self):
+        with self._lock:
+            self._start = 0
+            self._length = 0
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from utils.extraction_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Where transcoded tracks are stored
+CACHE_DIR = os.getenv('AUDIO_CACHE_DIR', '.audio_cache')
+
+# Total size of cached files (bytes); the cache is off unless this is set
+MAX_BYTES = int(os.getenv('AUDIO_CACHE_MAX_BYTES', 0))
+
+# Tracks longer than this (seconds) or of unknown length are never cached
+MAX_DURATION = int(os.getenv('AUDIO_CACHE_MAX_DURATION', 15 * 60))
+
+INDEX_FILE = 'index.json'
+
+
+"""
+On-disk cache of Opus/Ogg files for tracks that have already been played.
+
+Files are named after a hash of the track identity (the normalized page URL),
+so the same track played in different guilds maps to the same file. Tracks
+are written by the FFmpeg process that plays them (see `reserve`), so caching
+never downloads anything a second time. The LRU index is guarded by a lock
+because lookups and writes happen on the voice threads; files are written to
+a temporary name and renamed into place, so a partially written track is
+never served. The directory is only created once the first track is written.
+
+Attributes:
+    directory (str): The cache directory.
+    max_bytes (int): The total size cap for cached files.
+"""
+class AudioFileCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = OrderedDict()
+        self._size = 0
+        self._writing = set()
+
+        if self.enabled and os.path.isdir(directory):
+            self._load_index()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    """
+        Returns the cache key for a song, or None if it can't be cached.
+
+        Args:
+            song (Song): The song to look up.
+    """
+    def key_for(self, song):
+        if not self.enabled or not song.source:
+            return None
+        if not song.duration or song.duration > MAX_DURATION:
+            return None
+        return hashlib.sha256(normalize_query(song.source).encode()).hexdigest()[:32]
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.ogg")
+
+    """
+        Returns the path of a cached track and marks it as recently used.
+
+        Args:
+            key (str): The cache key from `key_for`.
+
+        Returns:
+            str | None: The file path, or None if the track isn't cached.
+    """
+    def lookup(self, key):
+        if not key:
+            return None
+
+        with self._lock:
+            if key not in self._index:
+                return None
+            path = self._path(key)
+            if not os.path.exists(path):
+                self._size -= self._index.pop(key)
+                return None
+            self._index.move_to_end(key)
+            return path
+
+    """
+        Claims the cache file for a song that is about to be played from the network.
+
+        Args:
+            song (Song): The song being played.
+
+        Returns:
+            tuple[str, str] | None: The cache key and the temporary path to write
+            the Ogg Opus stream to, or None if the song is cached, being written,
+            or can't be cached.
+    """
+    def reserve(self, song):
+        key = self.key_for(song)
+        if not key or not song.url:
+            return None
+
+        with self._lock:
+            if key in self._index or key in self._writing:
+                return None
+            self._writing.add(key)
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"Audio cache unavailable: {e}")
+            self._release(key)
+            return None
+        return key, f"{self._path(key)}.part"
+
+    """
+        Ends a write started with `reserve`.
+
+        Args:
+            key (str): The reserved key.
+            temp_path (str): The temporary path the track was written to.
+            complete (bool): True if the whole track was written, otherwise the file is discarded.
+    """
+    def finish(self, key, temp_path, complete):
+        try:
+            if complete and os.path.exists(temp_path):
+                path = self._path(key)
+                os.replace(temp_path, path)
+                self._add(key, os.path.getsize(path))
+        except OSError as e:
+            logger.error(f"Audio cache write failed: {e}")
+        finally:
+            self._release(key)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _release(self, key):
+        with self._lock:
+            self._writing.discard(key)
+
+    def _add(self, key, size):
+        with self._lock:
+            self._index[key] = size
+            self._size += size
+
+            while self._size > self.max_bytes and len(self._index) > 1:
+                old_key, old_size = self._index.popitem(last=False)
+                self._size -= old_size
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+            self._save_index()
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE)) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = []
+
+        for key, size in entries:
+            if os.path.exists(self._path(key)):
+                self._index[key] = size
+                self._size += size
+
+    def _save_index(self):
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        temp_path = f"{index_path}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(list(self._index.items()), f)
+            os.replace(temp_path, index_path)
+        except OSError as e:
+            logger.warning(f"Could not save audio cache index: {e}")
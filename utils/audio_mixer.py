@@ -0,0 +1,77 @@
+import os
+import numpy as np
+
+# Music volume while the bot speaks over it
+DUCK_GAIN = float(os.getenv('VOICE_DUCK_GAIN', 0.3))
+
+# Seconds the music takes to fade down to, or back up from, the ducked volume
+DUCK_RAMP = float(os.getenv('VOICE_DUCK_RAMP', 0.25))
+
+# Discord frames are 20 ms of 48 kHz stereo 16-bit PCM
+FRAME_DURATION = 0.02
+CHANNELS = 2
+
+
+"""
+Mixes speech over music one 20 ms PCM frame at a time, ducking the music.
+
+While speech is present the music gain ramps down to `duck_gain`, and it
+ramps back up once speech stops. The gain changes linearly across each frame
+so there are no clicks, and all the math is done on whole frames with NumPy.
+
+Attributes:
+    duck_gain (float): Music gain while speech plays.
+    gain (float): The music gain at the end of the last mixed frame.
+"""
+class DuckingMixer:
+    def __init__(self, duck_gain: float = DUCK_GAIN, ramp: float = DUCK_RAMP):
+        self.duck_gain = duck_gain
+        self.step = (1.0 - duck_gain) * FRAME_DURATION / ramp if ramp > 0 else 1.0
+        self.gain = 1.0
+
+    """True when the music is at full volume and frames can skip the mixer"""
+    @property
+    def idle(self) -> bool:
+        return self.gain >= 1.0
+
+    """Jump back to full music volume"""
+    def reset(self):
+        self.gain = 1.0
+
+    def _next_gain(self, speaking: bool) -> float:
+        target = self.duck_gain if speaking else 1.0
+        if self.gain > target:
+            return max(self.gain - self.step, target)
+        return min(self.gain + self.step, target)
+
+    """
+        Mix one frame.
+
+        Args:
+            music (bytes | None): A frame of music PCM, None if there is none.
+            speech (bytes | None): A frame of speech PCM, None if there is none.
+
+        Returns:
+            bytes: The mixed 16-bit PCM frame.
+    """
+    def mix(self, music: bytes = None, speech: bytes = None) -> bytes:
+        start, end = self.gain, self._next_gain(speech is not None)
+        self.gain = end
+
+        music = np.frombuffer(music, dtype=np.int16) if music else None
+        speech = np.frombuffer(speech, dtype=np.int16) if speech else None
+        length = max(len(music) if music is not None else 0, len(speech) if speech is not None else 0)
+
+        mixed = np.zeros(length, dtype=np.float32)
+        if music is not None:
+            if start == end:
+                mixed[:len(music)] = music * np.float32(start)
+            else:
+                # One gain per sample, shared by both channels
+                ramp = np.linspace(start, end, len(music) // CHANNELS, dtype=np.float32)
+                mixed[:len(music)] = music * np.repeat(ramp, CHANNELS)
+        if speech is not None:
+            mixed[:len(speech)] += speech
+
+        np.clip(mixed, -32768, 32767, out=mixed)
+        return mixed.astype(np.int16).tobytes()
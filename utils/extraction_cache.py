@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger(__name__)
+
+# Default memory cap for cached extraction results (bytes)
+DEFAULT_MAX_BYTES = int(os.getenv('YTDL_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+# Lifetime of entries whose stream URLs carry no expiry (search results, non-YouTube sources)
+DEFAULT_TTL = int(os.getenv('YTDL_CACHE_TTL', 3 * 60 * 60))
+
+# Entries are dropped this many seconds before their stream URL actually expires
+EXPIRY_MARGIN = int(os.getenv('YTDL_CACHE_EXPIRY_MARGIN', 5 * 60))
+
+_YOUTUBE_HOSTS = ('youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com')
+_EXPIRE_PATTERN = re.compile(r'[?&/]expire[=/](\d+)')
+
+
+"""
+Builds a cache key from a URL or a search query.
+
+YouTube links that point to the same video (watch, youtu.be, shorts, tracking
+params, timestamps) share one key; search queries are case and whitespace
+insensitive.
+
+Args:
+    query (str): The URL or search text passed to !play.
+
+Returns:
+    str: The normalized cache key.
+"""
+def normalize_query(query):
+    query = query.strip()
+    parsed = urlparse(query)
+
+    if parsed.scheme in ('http', 'https') and parsed.netloc:
+        host = parsed.netloc.lower()
+        path = parsed.path.rstrip('/')
+
+        if host == 'youtu.be' and path:
+            return f"youtube:{path.lstrip('/')}"
+
+        if host in _YOUTUBE_HOSTS:
+            video_id = parse_qs(parsed.query).get('v', [None])[0]
+            if video_id:
+                return f"youtube:{video_id}"
+            if path.startswith('/shorts/'):
+                return f"youtube:{path.split('/')[2]}"
+
+        return f"url:{host}{path}?{parsed.query}" if parsed.query else f"url:{host}{path}"
+
+    return f"search:{' '.join(query.lower().split())}"
+
+
+"""
+Reads the expiry timestamp embedded in a stream URL.
+
+Args:
+    url (str): A direct media URL (googlevideo URLs carry `expire=<unix time>`).
+
+Returns:
+    float | None: The unix timestamp at which the URL stops working, if present.
+"""
+def stream_expiry(url):
+    if not url:
+        return None
+    match = _EXPIRE_PATTERN.search(url)
+    return float(match.group(1)) if match else None
+
+
+"""
+Rough in-memory footprint of a cached info dict.
+
+Counts string payloads, which dominate the size of yt-dlp metadata (URLs,
+titles, headers), plus a fixed overhead per container element.
+"""
+def _estimate_size(value):
+    if isinstance(value, str):
+        return 49 + len(value)
+    if isinstance(value, dict):
+        return 64 + sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 56 + sum(_estimate_size(v) for v in value)
+    return 32
+
+
+"""A cached extraction result with its expiry and estimated size."""
+class CacheEntry:
+    __slots__ = ('info', 'audio_format', 'expires_at', 'size')
+
+    def __init__(self, info, audio_format, expires_at, size):
+        self.info = info
+        self.audio_format = audio_format
+        self.expires_at = expires_at
+        self.size = size
+
+
+"""
+Async LRU cache for yt-dlp extraction results.
+
+Entries expire shortly before the stream URL they hold stops working, and the
+least recently used entries are evicted once the estimated memory use goes
+above `max_bytes`.
+
+Attributes:
+    max_bytes (int): Memory cap for all cached entries.
+    default_ttl (int): Lifetime of entries without an embedded URL expiry.
+    hits (int): Number of successful lookups.
+    misses (int): Number of lookups that required a new extraction.
+"""
+class ExtractionCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, default_ttl=DEFAULT_TTL, expiry_margin=EXPIRY_MARGIN):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.expiry_margin = expiry_margin
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        return self._size
+
+    """
+        Returns the cached entry for a query, or None if missing or expired.
+
+        Args:
+            query (str): The URL or search text.
+
+        Returns:
+            CacheEntry | None: The cached entry.
+    """
+    async def get(self, query):
+        key = normalize_query(query)
+        async with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry.expires_at <= time.time():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    """
+        Stores an extraction result.
+
+        Args:
+            query (str): The URL or search text the result was extracted from.
+            info (dict): The (trimmed) yt-dlp info dict.
+            audio_format (dict | None): The audio format chosen for playback.
+
+        Returns:
+            CacheEntry | None: The stored entry, or None if it was already expired or too large.
+    """
+    async def set(self, query, info, audio_format=None):
+        now = time.time()
+        expires_at = now + self.default_ttl
+
+        urls = [info.get('url')]
+        if audio_format:
+            urls.append(audio_format.get('url'))
+        for expiry in filter(None, map(stream_expiry, urls)):
+            expires_at = min(expires_at, expiry - self.expiry_margin)
+
+        size = _estimate_size(info) + (_estimate_size(audio_format) if audio_format else 0)
+        if expires_at <= now or size > self.max_bytes:
+            return None
+
+        entry = CacheEntry(info, audio_format, expires_at, size)
+        key = normalize_query(query)
+        async with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._size += size
+            self._evict()
+        return entry
+
+    """Drops a query from the cache, e.g. when its stream URL was rejected."""
+    async def invalidate(self, query):
+        async with self._lock:
+            self._remove(normalize_query(query))
+
+    """Removes every cached entry."""
+    async def clear(self):
+        async with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._size -= entry.size
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            key, entry = self._entries.popitem(last=False)
+            self._size -= entry.size
+            logger.debug(f"Evicted {key} from extraction cache")
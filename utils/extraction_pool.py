@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from utils.extraction_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Number of long-lived extraction workers
+DEFAULT_WORKERS = int(os.getenv('YTDL_WORKERS', 4))
+
+# 'thread' or 'process'
+DEFAULT_MODE = os.getenv('YTDL_WORKER_MODE', 'thread')
+
+# Maximum number of distinct extractions waiting or running at once
+DEFAULT_MAX_PENDING = int(os.getenv('YTDL_MAX_PENDING', 32))
+
+# YoutubeDL instances owned by the current worker thread (or process), one per options profile
+_worker_state = threading.local()
+
+
+"""Raised when the extraction queue is full and a new request has to be rejected."""
+class ExtractionQueueFull(Exception):
+    pass
+
+
+"""
+Runs one extraction inside a worker, reusing that worker's YoutubeDL instance.
+
+Args:
+    profile (str): Name of the options profile, used to reuse the instance.
+    options (dict): The YoutubeDL options for this profile.
+    url (str): The URL or search query to extract.
+    sanitize (bool): Return a plain, picklable dict (needed in process mode).
+
+Returns:
+    dict | None: The extracted info dict.
+"""
+def _extract(profile, options, url, sanitize):
+    ydl = _instance(profile, options)
+    info = ydl.extract_info(url, download=False)
+    return ydl.sanitize_info(info) if sanitize and info else info
+
+
+"""Returns the worker's YoutubeDL instance for a profile, creating it on first use."""
+def _instance(profile, options):
+    instances = getattr(_worker_state, 'instances', None)
+    if instances is None:
+        instances = _worker_state.instances = {}
+
+    ydl = instances.get(profile)
+    if ydl is None:
+        # Imported here so yt-dlp's extractors only load once a worker needs them
+        from yt_dlp import YoutubeDL
+        ydl = instances[profile] = YoutubeDL(options)
+    return ydl
+
+
+"""Creates the worker's instances for every profile; returns nothing, so it works in process mode too."""
+def _warm(profiles):
+    for profile, options in profiles.items():
+        _instance(profile, options)
+
+
+"""An extraction shared by every caller asking for the same query."""
+class _Job:
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+"""
+Pool of long-lived yt-dlp workers with bounded concurrency.
+
+Identical requests that are in flight at the same time share one extraction.
+When every caller waiting on an extraction is cancelled (for example the
+!play command was abandoned), the extraction is cancelled too: queued work
+never reaches a worker and running work has its result discarded.
+
+Attributes:
+    workers (int): Number of worker threads or processes.
+    mode (str): 'thread' or 'process'.
+    max_pending (int): Maximum number of distinct extractions queued or running.
+"""
+class ExtractionPool:
+    def __init__(self, workers=DEFAULT_WORKERS, mode=DEFAULT_MODE, max_pending=DEFAULT_MAX_PENDING):
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"Unknown extraction worker mode: {mode}")
+
+        self.workers = workers
+        self.mode = mode
+        self.max_pending = max_pending
+        self._executor = None
+        self._slots = None
+        self._inflight = {}
+
+    @property
+    def pending(self):
+        return len(self._inflight)
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.mode == 'process':
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix='ytdl'
+                )
+            self._slots = asyncio.Semaphore(self.workers)
+        return self._executor
+
+    """
+        Extracts info for a URL or search query on a pool worker.
+
+        Args:
+            url (str): The URL or search query.
+            options (dict): The YoutubeDL options to use.
+            profile (str): Name identifying `options`, so workers can reuse their instance.
+
+        Returns:
+            dict | None: The extracted info dict.
+
+        Raises:
+            ExtractionQueueFull: If too many extractions are already pending.
+    """
+    async def extract(self, url, options, profile='default'):
+        key = (profile, normalize_query(url))
+        job = self._inflight.get(key)
+
+        if job is None:
+            if len(self._inflight) >= self.max_pending:
+                raise ExtractionQueueFull(f"{len(self._inflight)} extractions already pending")
+
+            job = _Job(asyncio.create_task(self._run(url, options, profile)))
+            self._inflight[key] = job
+            job.task.add_done_callback(lambda _: self._forget(key, job))
+
+        job.waiters += 1
+        try:
+            return await asyncio.shield(job.task)
+        finally:
+            job.waiters -= 1
+            if job.waiters == 0 and not job.task.done():
+                logger.debug(f"Extraction abandoned: {url}")
+                self._forget(key, job)
+                job.task.cancel()
+
+    def _forget(self, key, job):
+        if self._inflight.get(key) is job:
+            del self._inflight[key]
+
+    async def _run(self, url, options, profile):
+        executor = self._get_executor()
+        slots = self._slots
+        loop = asyncio.get_running_loop()
+        await slots.acquire()
+        try:
+            future = executor.submit(_extract, profile, options, url, self.mode == 'process')
+        except BaseException:
+            slots.release()
+            raise
+
+        # A cancelled caller can't stop a running yt-dlp thread, so the slot is
+        # only given back once the worker is actually done with the job
+        future.add_done_callback(lambda _: self._release(loop, slots))
+        return await asyncio.wrap_future(future)
+
+    @staticmethod
+    def _release(loop, slots):
+        try:
+            loop.call_soon_threadsafe(slots.release)
+        except RuntimeError:
+            # The event loop is already closed, nobody is waiting for the slot
+            pass
+
+    """
+        Loads yt-dlp on the workers ahead of the first request.
+
+        One warm-up job per worker is submitted at once, so each idle worker
+        normally picks one up. The executor doesn't guarantee that, and a
+        worker that misses out loads yt-dlp on its first extraction instead.
+
+        Args:
+            profiles (dict): Options profiles to prepare, keyed by name.
+    """
+    async def warm_up(self, profiles):
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(executor, _warm, profiles) for _ in range(self.workers)))
+
+    """Stops the workers, cancelling queued extractions."""
+    def shutdown(self):
+        for job in list(self._inflight.values()):
+            job.task.cancel()
+        self._inflight.clear()
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Discord's message length limit
+MESSAGE_LIMIT = 2000
+
+# Minimum seconds between edits of the same message (Discord allows about 5 edits per 5 seconds)
+EDIT_INTERVAL = float(os.getenv('STREAM_EDIT_INTERVAL', 1.2))
+
+
+"""
+Discord message that grows as text is streamed into it.
+
+Appended text is coalesced so the message is edited at most once every
+`interval` seconds. When the text no longer fits in one message, the current
+message is finalized (split at the last line break or space) and the rest
+continues in a new message.
+
+Attributes:
+    channel (discord.abc.Messageable): Where the messages are sent.
+    prefix (str): Text placed before the content of the first message.
+    interval (float): Minimum seconds between edits.
+"""
+class StreamingMessage:
+    def __init__(self, channel, prefix='', interval=EDIT_INTERVAL):
+        self.channel = channel
+        self.prefix = prefix
+        self.interval = interval
+        self.messages = []
+        self._current = None
+        self._text = prefix
+        self._shown = None
+        self._last_edit = 0
+        self._flush_task = None
+        self._lock = asyncio.Lock()
+
+    """Adds streamed text, updating the message now or after the edit interval."""
+    async def append(self, text):
+        if not text:
+            return
+        self._text += text
+
+        wait = self.interval - (time.monotonic() - self._last_edit)
+        if wait <= 0 or len(self._text) > MESSAGE_LIMIT:
+            await self._flush()
+        elif not self._flush_task or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later(wait))
+
+    """Shows the remaining text. Call once the stream is complete."""
+    async def finish(self):
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        if self._text != self.prefix:
+            await self._flush()
+
+    async def _flush_later(self, delay):
+        await asyncio.sleep(delay)
+        # Once started, the flush isn't interrupted by finish(): a cancelled send
+        # could still post the message without it being recorded, and finish()
+        # waits for the lock anyway
+        await asyncio.shield(self._flush())
+
+    async def _flush(self):
+        async with self._lock:
+            while len(self._text) > MESSAGE_LIMIT:
+                cut = max(self._text.rfind('\n', 0, MESSAGE_LIMIT), self._text.rfind(' ', 0, MESSAGE_LIMIT))
+                if cut <= 0:
+                    cut = MESSAGE_LIMIT
+                await self._show(self._text[:cut])
+                # The rest continues in a new message
+                self._text = self._text[cut:].lstrip()
+                self._current = None
+                self._shown = None
+
+            if self._text.strip() and self._text != self._shown:
+                await self._show(self._text)
+
+    async def _show(self, content):
+        self._last_edit = time.monotonic()
+        try:
+            if self._current:
+                await self._current.edit(content=content)
+            else:
+                self._current = await self.channel.send(content)
+                self.messages.append(self._current)
+            self._shown = content
+        except Exception as e:
+            logger.warning(f"Could not update streamed message: {e}")
@@ -0,0 +1,208 @@
+import os
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Port of the local /metrics endpoint, '0' disables it
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9108))
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+
+# Default histogram buckets in seconds, from a few milliseconds up to a slow extraction
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+"""
+Base class of a metric with optional labels.
+
+Each metric keeps its values in a dict keyed by label values, guarded by a
+lock that is only ever held for a few dict operations, so recording from
+the audio and worker threads costs next to nothing.
+"""
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, description: str, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        self._function = None
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labels)
+
+    """Read the value from `function` whenever metrics are scraped, for values kept elsewhere"""
+    def set_function(self, function):
+        self._function = function
+
+    def render(self) -> list:
+        if self._function is not None:
+            try:
+                value = self._function()
+                with self._lock:
+                    self._values[()] = value
+            except Exception as e:
+                logger.debug(f"Metric {self.name} failed: {e}")
+
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+"""A value that only goes up, e.g. the number of playback errors."""
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+"""A value that goes up and down, e.g. a queue depth."""
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+"""Counts observations in cumulative buckets, e.g. request latencies."""
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (plus +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    """Observe the duration of the block in seconds"""
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+"""
+Holds every metric and renders them in the Prometheus text format.
+
+Asking for a metric that already exists returns it, so modules can declare
+the metrics they use at import time without coordinating.
+"""
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, description, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, description, labels, **kwargs)
+            return metric
+
+    def counter(self, name: str, description: str, labels=()) -> Counter:
+        return self._get(Counter, name, description, labels)
+
+    def gauge(self, name: str, description: str, labels=()) -> Gauge:
+        return self._get(Gauge, name, description, labels)
+
+    def histogram(self, name: str, description: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, description, labels, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+"""
+Serves the registry at http://METRICS_HOST:METRICS_PORT/metrics.
+
+Attributes:
+    port (int): The port to listen on.
+"""
+class MetricsServer:
+    def __init__(self, registry: Registry = REGISTRY, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self):
+        from aiohttp import web
+
+        async def metrics(request):
+            return web.Response(text=self.registry.render(), content_type='text/plain', charset='utf-8')
+
+        app = web.Application()
+        app.router.add_get('/metrics', metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Metrics available at http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,181 @@
+import itertools
+import os
+import random
+from collections import Counter, deque
+
+# Maximum number of songs queued in one guild
+MAX_QUEUE = int(os.getenv('MUSIC_MAX_QUEUE', 5000))
+
+# Maximum number of queued songs per requester, 0 for no limit
+MAX_PER_REQUESTER = int(os.getenv('MUSIC_MAX_PER_REQUESTER', 1000))
+
+
+"""Raised when a song can't be queued because a queue limit was reached."""
+class QueueFull(Exception):
+    pass
+
+
+"""
+Song queue for a single guild.
+
+Backed by a deque, so taking the next song is O(1) and paging through the
+start of the queue never copies the whole list. Every song gets an insertion
+number when queued, which lets `unshuffle` restore the original order of the
+songs still waiting.
+
+Attributes:
+    max_size (int): Maximum number of queued songs.
+    max_per_requester (int): Maximum queued songs per requester (0 for no limit).
+    shuffled (bool): True while the queue is shuffled.
+"""
+class MusicQueue:
+    def __init__(self, max_size=MAX_QUEUE, max_per_requester=MAX_PER_REQUESTER):
+        self.max_size = max_size
+        self.max_per_requester = max_per_requester
+        self.shuffled = False
+        self._songs = deque()
+        self._members = set()
+        self._per_requester = Counter()
+        self._order = itertools.count()
+
+    def __len__(self):
+        return len(self._songs)
+
+    def __bool__(self):
+        return bool(self._songs)
+
+    def __iter__(self):
+        return iter(self._songs)
+
+    def __contains__(self, song):
+        return id(song) in self._members
+
+    @staticmethod
+    def _requester_key(song):
+        return song.requester_id or song.requester
+
+    """
+        Returns why a song can't be queued, or None if it can.
+
+        Args:
+            song (Song): The song to check.
+    """
+    def check_limits(self, song):
+        if len(self._songs) >= self.max_size:
+            return f"the queue is full ({self.max_size} songs)"
+        if self.max_per_requester and self._per_requester[self._requester_key(song)] >= self.max_per_requester:
+            return f"{song.requester} already has {self.max_per_requester} songs queued"
+        return None
+
+    """
+        Adds a song to the end of the queue.
+
+        Raises:
+            QueueFull: If the guild or requester limit was reached.
+    """
+    def append(self, song):
+        reason = self.check_limits(song)
+        if reason:
+            raise QueueFull(reason)
+
+        song.queue_order = next(self._order)
+        self._songs.append(song)
+        self._members.add(id(song))
+        self._per_requester[self._requester_key(song)] += 1
+
+    """
+        Adds songs until a limit is reached.
+
+        Returns:
+            list[Song]: The songs that were queued.
+    """
+    def extend(self, songs):
+        added = []
+        for song in songs:
+            if self.check_limits(song):
+                break
+            self.append(song)
+            added.append(song)
+        return added
+
+    def _forget(self, song):
+        self._members.discard(id(song))
+        key = self._requester_key(song)
+        self._per_requester[key] -= 1
+        if self._per_requester[key] <= 0:
+            del self._per_requester[key]
+
+    """Removes and returns the next song."""
+    def popleft(self):
+        song = self._songs.popleft()
+        self._forget(song)
+        return song
+
+    """Returns the next `count` songs without removing them."""
+    def peek(self, count):
+        return list(itertools.islice(self._songs, count))
+
+    """
+        Returns one page of the queue.
+
+        Args:
+            page (int): The 1-based page number.
+            per_page (int): Songs per page.
+
+        Returns:
+            list[tuple[int, Song]]: The 1-based positions and songs on the page.
+    """
+    def page(self, page, per_page=10):
+        start = (page - 1) * per_page
+        return list(enumerate(itertools.islice(self._songs, start, start + per_page), start=start + 1))
+
+    """Removes a song, wherever it is in the queue."""
+    def remove(self, song):
+        if song in self:
+            self._songs.remove(song)
+            self._forget(song)
+
+    """
+        Removes and returns the song at a 0-based index.
+
+        Raises:
+            IndexError: If the index is out of range.
+    """
+    def remove_at(self, index):
+        song = self._songs[index]
+        del self._songs[index]
+        self._forget(song)
+        return song
+
+    """
+        Moves the song at `source` to `destination` (0-based indexes).
+
+        Raises:
+            IndexError: If either index is out of range.
+    """
+    def move(self, source, destination):
+        if not 0 <= destination < len(self._songs):
+            raise IndexError(destination)
+        song = self._songs[source]
+        del self._songs[source]
+        self._songs.insert(destination, song)
+        return song
+
+    """Shuffles the queue, keeping the insertion order for `unshuffle`."""
+    def shuffle(self):
+        songs = list(self._songs)
+        random.shuffle(songs)
+        self._songs = deque(songs)
+        self.shuffled = True
+
+    """Restores the order in which the remaining songs were queued."""
+    def unshuffle(self):
+        self._songs = deque(sorted(self._songs, key=lambda song: song.queue_order))
+        self.shuffled = False
+
+    """Removes every song."""
+    def clear(self):
+        self._songs.clear()
+        self._members.clear()
+        self._per_requester.clear()
+        self.shuffled = False
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Playlist entries resolved at the same time, kept low so single !play requests aren't starved
+RESOLVE_CONCURRENCY = int(os.getenv('MUSIC_PLAYLIST_CONCURRENCY', 2))
+
+# Minimum seconds between edits of the progress message
+PROGRESS_INTERVAL = 3
+
+
+"""
+Resolves the placeholder songs of a playlist in the background.
+
+Placeholders are resolved in queue order through the guild's prefetcher, so
+songs that are already resolved (or currently being resolved) are not
+extracted twice. Entries that cannot be resolved are dropped from the queue.
+Progress is reported by editing a single message.
+
+Attributes:
+    state (GuildMusicState): The guild the playlist was queued in.
+    songs (list[Song]): The placeholder songs, in playlist order.
+    title (str): The playlist title.
+    message (discord.Message): The message used for progress updates.
+"""
+class PlaylistLoader:
+    def __init__(self, state, songs, title, message):
+        self.state = state
+        self.songs = songs
+        self.title = title
+        self.message = message
+        self.resolved = 0
+        self.failed = 0
+        self._last_edit = 0
+        self._task = None
+
+    """Starts resolving in the background and returns the task."""
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+        return self._task
+
+    """Stops resolving, e.g. when the queue is cleared."""
+    def cancel(self):
+        if self._task:
+            self._task.get_loop().call_soon_threadsafe(self._task.cancel)
+
+    async def _resolve(self, song, slots):
+        async with slots:
+            ok = bool(song.url) or await self.state.prefetcher.refresh(song)
+
+        if ok:
+            self.resolved += 1
+        else:
+            self.failed += 1
+            if song in self.state.queue:
+                self.state.queue.remove(song)
+        await self._report()
+
+    async def _report(self, final=False):
+        now = time.monotonic()
+        if not final and now - self._last_edit < PROGRESS_INTERVAL:
+            return
+        self._last_edit = now
+
+        total = len(self.songs)
+        if final:
+            content = f"✅ Added {self.resolved} songs from **{self.title}**"
+            if self.failed:
+                content += f" ({self.failed} unavailable)"
+        else:
+            content = f"📃 Loading **{self.title}**: {self.resolved + self.failed}/{total} resolved"
+
+        try:
+            await self.message.edit(content=content)
+        except Exception as e:
+            logger.debug(f"Could not update playlist progress: {e}")
+
+    async def _run(self):
+        slots = asyncio.Semaphore(RESOLVE_CONCURRENCY)
+        try:
+            await asyncio.gather(*(self._resolve(song, slots) for song in self.songs))
+            await self._report(final=True)
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+import time
+import aiohttp
+import discord
+from utils.yt_helper import YTDLHelper
+from utils.extraction_cache import stream_expiry
+
+logger = logging.getLogger(__name__)
+
+# Number of upcoming songs kept freshly resolved
+PREFETCH_AHEAD = int(os.getenv('MUSIC_PREFETCH_AHEAD', 3))
+
+# Songs whose stream URL expires within this many seconds are re-resolved
+REFRESH_MARGIN = int(os.getenv('MUSIC_REFRESH_MARGIN', 10 * 60))
+
+# Minimum pause between passes, so a failing refresh isn't retried in a tight loop
+RETRY_DELAY = 30
+
+# Bytes requested when probing a stream URL
+PROBE_BYTES = 64 * 1024
+
+PROBE_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+
+"""
+Background task that keeps the head of a guild's queue ready to play.
+
+The next `lookahead` songs are re-resolved when their stream URL is missing or
+close to expiring, and the first bytes of each stream are fetched once so a
+dead link is caught (and replaced) before the song reaches the player.
+
+Attributes:
+    state (GuildMusicState): The guild whose queue is prefetched.
+    lookahead (int): Number of upcoming songs to keep ready.
+    refresh_margin (int): Seconds before expiry at which a URL is refreshed.
+"""
+class QueuePrefetcher:
+    def __init__(self, state, lookahead=PREFETCH_AHEAD, refresh_margin=REFRESH_MARGIN):
+        self.state = state
+        self.lookahead = lookahead
+        self.refresh_margin = refresh_margin
+        self._loop = None
+        self._task = None
+        self._wake = None
+
+    """
+        Starts the prefetch loop if it isn't running yet.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): The bot's event loop.
+    """
+    def start(self, loop):
+        if self._task and not self._task.done():
+            return
+        self._loop = loop
+        self._wake = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    """Asks the loop to look at the queue again. Safe to call from the voice thread."""
+    def wake(self):
+        if self._loop and self._wake:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    """Stops the prefetch loop and closes its HTTP session."""
+    def stop(self):
+        if self._task:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+            self._task = None
+
+    """Returns True if the song has no stream URL or it expires soon."""
+    def needs_refresh(self, song):
+        if not song.url:
+            return True
+        return self._expires_soon(song.expires_at)
+
+    def _expires_soon(self, expires_at):
+        return expires_at is not None and expires_at - time.time() < self.refresh_margin
+
+    """
+        Resolves a fresh stream URL for a song.
+
+        A cached extraction is used while its URL is good for longer than the
+        refresh margin; otherwise, or when `force` is set, it is resolved again.
+
+        Args:
+            song (Song): The song to refresh, updated in place.
+            force (bool): Skip the extraction cache, e.g. after the probe rejected the URL.
+
+        Returns:
+            bool: True if the song now has a playable URL.
+    """
+    async def refresh(self, song, force=False):
+        if not song.source:
+            return bool(song.url)
+
+        if force:
+            await YTDLHelper.cache.invalidate(song.source)
+        info = await YTDLHelper.extract_info(song.source)
+        format = YTDLHelper.select_audio_format(info) if info else None
+
+        if format and not force and self._expires_soon(stream_expiry(format['url'])):
+            # The cached URL is about to expire as well
+            await YTDLHelper.cache.invalidate(song.source)
+            info = await YTDLHelper.extract_info(song.source)
+            format = YTDLHelper.select_audio_format(info) if info else None
+
+        if not format:
+            logger.warning(f"Could not refresh stream for {song.title}")
+            return False
+
+        song.update_stream(format, info.get('duration'))
+        return True
+
+    async def _probe(self, session, song):
+        headers = dict(song.http_headers or {})
+        headers['Range'] = f"bytes=0-{PROBE_BYTES - 1}"
+        try:
+            async with session.get(song.url, headers=headers) as response:
+                if response.status not in (200, 206):
+                    return False
+                await response.content.read(PROBE_BYTES)
+                return True
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.debug(f"Probe failed for {song.title}: {e}")
+            return False
+
+    async def _detect_codec(self, song):
+        codec, bitrate = None, None
+        try:
+            codec, bitrate = await discord.FFmpegOpusAudio.probe(song.url)
+        except Exception as e:
+            logger.debug(f"Codec probe failed for {song.title}: {e}")
+
+        # Remember failed probes too, so they aren't retried on every pass
+        song.codec = codec or 'unknown'
+        song.bitrate = song.bitrate or bitrate
+
+    async def _prepare(self, session, song):
+        if self.needs_refresh(song) and not await self.refresh(song):
+            return
+
+        if song.probed_url != song.url:
+            if not await self._probe(session, song) and not (
+                await self.refresh(song, force=True) and await self._probe(session, song)
+            ):
+                return
+            song.probed_url = song.url
+
+        # Formats without codec metadata are probed so Opus sources can still skip re-encoding
+        if song.codec is None:
+            await self._detect_codec(song)
+
+    def _next_deadline(self, songs):
+        deadlines = [s.expires_at - self.refresh_margin for s in songs if s.url and s.expires_at]
+        if not deadlines:
+            return None
+        return max(RETRY_DELAY, min(deadlines) - time.time())
+
+    async def _run(self):
+        # Owned by this task only, so a loop restarted while this one unwinds keeps its own session
+        session = aiohttp.ClientSession(timeout=PROBE_TIMEOUT)
+        try:
+            while True:
+                self._wake.clear()
+                upcoming = self.state.queue.peek(self.lookahead)
+                for song in upcoming:
+                    try:
+                        await self._prepare(session, song)
+                    except Exception as e:
+                        logger.error(f"Prefetch failed for {song.title}: {e}")
+
+                # Sleep until the queue changes or the earliest upcoming URL needs refreshing
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self._next_deadline(upcoming))
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await session.close()
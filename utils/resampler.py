@@ -0,0 +1,79 @@
+import numpy as np
+
+try:
+    import soxr
+except ImportError:
+    soxr = None
+
+# Taps of the anti-aliasing filter used when soxr isn't available
+FALLBACK_TAPS = 96
+
+
+"""
+Streaming resampler from Discord's 48 kHz stereo PCM to mono float32 at a lower rate.
+
+Chunks can be as small as a single 20 ms packet: the filter state is kept
+between calls, so feeding a stream piece by piece gives the same result as
+resampling it in one go. Uses soxr's band-limited resampler when installed,
+otherwise a windowed-sinc low-pass filter from SciPy followed by decimation
+(which needs the input rate to be a multiple of the output rate).
+
+Attributes:
+    in_rate (int): The input sample rate.
+    out_rate (int): The output sample rate.
+    channels (int): Channels in the input, averaged down to mono.
+"""
+class StreamingResampler:
+    def __init__(self, in_rate: int = 48000, out_rate: int = 16000, channels: int = 2, quality: str = 'HQ'):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.channels = channels
+
+        if soxr is not None:
+            self._stream = soxr.ResampleStream(in_rate, out_rate, 1, dtype='float32', quality=quality)
+            return
+
+        from scipy import signal
+
+        if in_rate % out_rate:
+            raise ValueError(f"Can't resample {in_rate} Hz to {out_rate} Hz without soxr")
+        self._stream = None
+        self._signal = signal
+        self._factor = in_rate // out_rate
+        self._taps = signal.firwin(FALLBACK_TAPS, 0.9 / self._factor).astype(np.float32)
+        self._state = np.zeros(len(self._taps) - 1, dtype=np.float32)
+        self._phase = 0
+
+    """Average interleaved 16-bit samples to mono float32 in [-1, 1]"""
+    def downmix(self, samples: np.ndarray) -> np.ndarray:
+        frames = samples.reshape(-1, self.channels)
+        return frames.sum(axis=1, dtype=np.float32) * np.float32(1 / (32768 * self.channels))
+
+    """
+        Resample the next chunk of the stream.
+
+        Args:
+            samples (np.ndarray): Interleaved int16 samples.
+            last (bool): True for the final chunk, to flush the filter.
+
+        Returns:
+            np.ndarray: Mono float32 samples at `out_rate`.
+    """
+    def process(self, samples: np.ndarray, last: bool = False) -> np.ndarray:
+        mono = self.downmix(samples)
+        if self._stream is not None:
+            return self._stream.resample_chunk(mono, last=last)
+
+        filtered, self._state = self._signal.lfilter(self._taps, 1.0, mono, zi=self._state)
+        # Keep every n-th sample, continuing the phase from the previous chunk
+        output = filtered[self._phase::self._factor]
+        self._phase = (self._phase - len(mono)) % self._factor
+        return output.astype(np.float32, copy=False)
+
+    """Forget the stream so far, e.g. after a gap in the audio"""
+    def reset(self):
+        if self._stream is not None:
+            self._stream.clear()
+        else:
+            self._state[:] = 0
+            self._phase = 0
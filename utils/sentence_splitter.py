@@ -0,0 +1,48 @@
+import re
+
+# End of a sentence: terminal punctuation (optionally followed by quotes/brackets) and whitespace
+_SENTENCE_END = re.compile(r'[.!?…]+["\')\]]*\s+|\n+')
+
+# Fragments shorter than this are merged into the next sentence
+MIN_SENTENCE_LENGTH = 12
+
+
+"""
+Splits streamed text into sentences as soon as each one is complete.
+
+Very short fragments ("Yes.", "1.") are held back and joined with the next
+sentence so speech synthesis isn't called for a word at a time.
+"""
+class SentenceSplitter:
+    def __init__(self, min_length=MIN_SENTENCE_LENGTH):
+        self.min_length = min_length
+        self._buffer = ''
+
+    """
+        Adds streamed text.
+
+        Args:
+            text (str): The next chunk of text.
+
+        Returns:
+            list[str]: The sentences completed by this chunk.
+    """
+    def feed(self, text):
+        self._buffer += text
+        sentences = []
+        start = 0
+
+        for match in _SENTENCE_END.finditer(self._buffer):
+            sentence = self._buffer[start:match.end()].strip()
+            if len(sentence) >= self.min_length:
+                sentences.append(sentence)
+                start = match.end()
+
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    """Returns whatever text is left once the stream has ended."""
+    def flush(self):
+        rest = self._buffer.strip()
+        self._buffer = ''
+        return [rest] if rest else []
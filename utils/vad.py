@@ -0,0 +1,125 @@
+import os
+import numpy as np
+
+# Frames louder than this (dBFS), and clearly above the noise floor, count as speech
+THRESHOLD_DB = float(os.getenv('VAD_THRESHOLD_DB', -42))
+NOISE_MARGIN_DB = 9
+
+# Trailing silence that ends an utterance, and the longest utterance allowed
+SILENCE_SECONDS = float(os.getenv('VAD_SILENCE_SECONDS', 0.6))
+MAX_UTTERANCE_SECONDS = float(os.getenv('VAD_MAX_SECONDS', 15))
+
+# Utterances with less speech than this are dropped as noise
+MIN_SPEECH_SECONDS = 0.25
+
+# Audio kept from before speech starts, so the first syllable isn't clipped
+PRE_ROLL_SECONDS = 0.2
+
+FRAME_SECONDS = 0.03
+
+
+"""
+Splits a mono audio stream into utterances using frame energy.
+
+Audio is cut into 30 ms frames and each frame's level is compared with a
+fixed threshold and an adaptive noise floor. An utterance starts at the
+first speech frame (plus a short pre-roll) and ends after `silence_seconds`
+of silence or at `max_seconds`. Silence between utterances is discarded and
+never reaches the transcriber.
+
+Attributes:
+    sample_rate (int): The sample rate of the audio fed in.
+    active (bool): True while an utterance is in progress.
+"""
+class UtteranceSegmenter:
+    def __init__(self, sample_rate: int = 16000, threshold_db: float = THRESHOLD_DB,
+                 silence_seconds: float = SILENCE_SECONDS, max_seconds: float = MAX_UTTERANCE_SECONDS):
+        self.sample_rate = sample_rate
+        self.threshold_db = threshold_db
+        self.frame_length = int(sample_rate * FRAME_SECONDS)
+        self.silence_frames = max(1, round(silence_seconds / FRAME_SECONDS))
+        self.max_frames = max(1, round(max_seconds / FRAME_SECONDS))
+        self.min_speech_frames = max(1, round(MIN_SPEECH_SECONDS / FRAME_SECONDS))
+        self.pre_roll_frames = round(PRE_ROLL_SECONDS / FRAME_SECONDS)
+        self.noise_floor_db = threshold_db - NOISE_MARGIN_DB
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._pre_roll = []
+        self._frames = []
+        self._speech_frames = 0
+        self._silent_run = 0
+
+    @property
+    def active(self) -> bool:
+        return bool(self._frames)
+
+    """Level of each frame in dBFS"""
+    @staticmethod
+    def frame_levels(frames: np.ndarray) -> np.ndarray:
+        rms = np.sqrt(np.mean(np.square(frames), axis=1))
+        return 20 * np.log10(np.maximum(rms, 1e-6))
+
+    """
+        Add audio and return the utterances it completed.
+
+        Args:
+            audio (np.ndarray): Mono float32 samples in [-1, 1].
+
+        Returns:
+            list[np.ndarray]: Completed utterances, oldest first.
+    """
+    def feed(self, audio: np.ndarray) -> list:
+        if len(self._pending):
+            audio = np.concatenate((self._pending, audio))
+        usable = len(audio) - len(audio) % self.frame_length
+        self._pending = audio[usable:].copy()
+        if not usable:
+            return []
+
+        frames = audio[:usable].reshape(-1, self.frame_length)
+        levels = self.frame_levels(frames)
+
+        utterances = []
+        for frame, level in zip(frames, levels):
+            speech = level > max(self.threshold_db, self.noise_floor_db + NOISE_MARGIN_DB)
+            if not speech:
+                # Follow the background level slowly, so steady noise doesn't count as speech
+                self.noise_floor_db += 0.05 * (level - self.noise_floor_db)
+
+            if not self._frames:
+                if speech:
+                    self._frames = self._pre_roll + [frame]
+                    self._pre_roll = []
+                    self._speech_frames = 1
+                    self._silent_run = 0
+                elif self.pre_roll_frames:
+                    self._pre_roll = (self._pre_roll + [frame])[-self.pre_roll_frames:]
+                continue
+
+            self._frames.append(frame)
+            if speech:
+                self._speech_frames += 1
+                self._silent_run = 0
+            else:
+                self._silent_run += 1
+
+            if self._silent_run >= self.silence_frames or len(self._frames) >= self.max_frames:
+                utterance = self._close()
+                if utterance is not None:
+                    utterances.append(utterance)
+        return utterances
+
+    """End the current utterance, e.g. when the speaker stopped sending audio"""
+    def flush(self):
+        return self._close() if self._frames else None
+
+    def _close(self):
+        frames, speech_frames, silent_run = self._frames, self._speech_frames, self._silent_run
+        self._frames = []
+        self._speech_frames = 0
+        self._silent_run = 0
+
+        if speech_frames < self.min_speech_frames:
+            return None
+        # Trim the trailing silence, keeping a little of it
+        keep = len(frames) - max(0, silent_run - self.pre_roll_frames)
+        return np.concatenate(frames[:keep])
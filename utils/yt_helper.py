@@ -1,6 +1,10 @@
-from yt_dlp import YoutubeDL
+from utils.extraction_cache import ExtractionCache
+from utils.extraction_pool import ExtractionPool, ExtractionQueueFull
+from utils import metrics
 import asyncio
 import logging
+import os
+from urllib.parse import urlparse, parse_qs
 
 # Set up logging for debugging and error tracking
 logger = logging.getLogger(__name__)
@@ -24,12 +28,178 @@ YDL_OPTIONS = {
     'verbose': True  
 }
 
+# Options for listing a playlist without resolving each entry
+PLAYLIST_OPTIONS = {
+    **YDL_OPTIONS,
+    'noplaylist': False,
+    'extract_flat': 'in_playlist',
+    'playlistend': int(os.getenv('MUSIC_PLAYLIST_LIMIT', 500)),
+    'postprocessors': [],
+}
+
+# Containers/codecs accepted for playback
+VALID_FORMATS = (
+    'webm', 'opus', 'm4a',
+    'mp3', 'ogg', 'wav',
+    'aac', 'flac'
+)
+
+# Preferred audio bitrate (kbps) when several audio formats are available
+TARGET_BITRATE = int(os.getenv('MUSIC_TARGET_BITRATE', 128))
+
+# Metadata kept in cached results, everything else yt-dlp returns is dropped
+INFO_KEYS = (
+    'id', 'title', 'url', 'webpage_url', 'original_url', 'duration',
+    'ext', 'acodec', 'vcodec', 'abr', 'asr', 'extractor_key', 'is_live'
+)
+FORMAT_KEYS = ('format_id', 'url', 'ext', 'acodec', 'vcodec', 'abr', 'asr', 'http_headers')
+
+# Seconds before an extraction is abandoned and its worker job cancelled
+EXTRACT_TIMEOUT = float(os.getenv('YTDL_TIMEOUT', 30))
+
+EXTRACTION_SECONDS = metrics.histogram('ytdl_extraction_seconds', "Time spent extracting with yt-dlp", ('kind',))
+EXTRACTION_FAILURES = metrics.counter('ytdl_extraction_failures_total', "Extractions that failed", ('kind', 'reason'))
+CACHE_HITS = metrics.counter('ytdl_cache_hits_total', "Extractions served from the cache")
+
 """Helper class to extract audio stream URLs from YouTube using yt-dlp."""
 class YTDLHelper:
-    
+
+    # Shared between guilds so repeated queries skip extraction
+    cache = ExtractionCache()
+
+    # Long-lived YoutubeDL workers, separate from the default executor
+    pool = ExtractionPool()
+
+    """
+        Picks the audio-only format used for playback.
+
+        Opus formats are preferred since they can be sent to Discord without
+        re-encoding. Among equally preferred formats, the lowest bitrate at or
+        above `target_bitrate` wins, falling back to the highest bitrate below it.
+
+        Args:
+            entry (dict): A yt-dlp info dict.
+            target_bitrate (int): The desired audio bitrate in kbps.
+
+        Returns:
+            dict | None: The selected format, or None if no playable audio exists.
+    """
+    @staticmethod
+    def select_audio_format(entry, target_bitrate=TARGET_BITRATE):
+        candidates = [
+            f for f in entry.get('formats') or []
+            if f.get('url') and f.get('acodec') != 'none' and f.get('vcodec') == 'none'
+            and (f.get('ext') in VALID_FORMATS or YTDLHelper.audio_codec(f) in VALID_FORMATS)
+        ]
+
+        if not candidates:
+            return None
+
+        def rank(f):
+            abr = f.get('abr') or 0
+            meets_target = abr >= target_bitrate
+            return (YTDLHelper.audio_codec(f) == 'opus', meets_target, -abr if meets_target else abr)
+
+        return max(candidates, key=rank)
+
+    """
+        Returns the normalized audio codec of a format ('opus', 'aac', ...), or None if unknown.
+    """
+    @staticmethod
+    def audio_codec(format):
+        acodec = (format.get('acodec') or '').lower()
+        if not acodec or acodec == 'none':
+            return None
+        if acodec.startswith('mp4a'):
+            return 'aac'
+        return acodec.split('.')[0]
+
+    """
+        Reduces an info dict to what playback needs, so cached entries stay small.
+
+        Args:
+            info (dict): The full yt-dlp info dict.
+            audio_format (dict | None): The format chosen for playback.
+
+        Returns:
+            dict: The trimmed info dict.
+    """
+    @staticmethod
+    def trim_info(info, audio_format):
+        trimmed = {key: info[key] for key in INFO_KEYS if key in info}
+        trimmed['formats'] = [
+            {key: audio_format[key] for key in FORMAT_KEYS if key in audio_format}
+        ] if audio_format else []
+        return trimmed
+
+    """
+        Returns True if the URL points to a playlist rather than a single video.
+
+        Watch links that merely carry a `list=` parameter are treated as single
+        videos, as `noplaylist` does during extraction.
+    """
+    @staticmethod
+    def is_playlist_url(url):
+        parsed = urlparse(url.strip())
+        if parsed.scheme not in ('http', 'https'):
+            return False
+
+        params = parse_qs(parsed.query)
+        return 'list' in params and 'v' not in params and 'youtu.be' not in parsed.netloc
+
+    """
+        Lists the entries of a playlist without resolving their audio streams.
+
+        Args:
+            url (str): The playlist URL.
+
+        Returns:
+            tuple[str, list[dict]] | None: The playlist title and its entries, each
+            with a `title`, `duration` and the page `url` to resolve later, or None
+            if extraction fails.
+    """
+    @staticmethod
+    async def extract_playlist(url):
+        try:
+            with EXTRACTION_SECONDS.time(kind='playlist'):
+                info = await asyncio.wait_for(
+                    YTDLHelper.pool.extract(url, PLAYLIST_OPTIONS, profile='playlist'),
+                    timeout=EXTRACT_TIMEOUT
+                )
+        except asyncio.TimeoutError:
+            EXTRACTION_FAILURES.inc(kind='playlist', reason='timeout')
+            logger.warning(f"Playlist extraction timed out after {EXTRACT_TIMEOUT}s: {url}")
+            return None
+        except Exception as e:
+            EXTRACTION_FAILURES.inc(kind='playlist', reason='error')
+            logger.error(f"YTDL Playlist Error: {str(e)}", exc_info=True)
+            return None
+
+        if not info or info.get('_type') != 'playlist':
+            return None
+
+        entries = []
+        for entry in info.get('entries') or []:
+            if not entry:
+                continue
+            page_url = entry.get('url') or entry.get('webpage_url')
+            if not page_url and entry.get('id'):
+                page_url = f"https://www.youtube.com/watch?v={entry['id']}"
+            if page_url:
+                entries.append({
+                    'title': entry.get('title') or 'Unknown Title',
+                    'url': page_url,
+                    'duration': entry.get('duration')
+                })
+
+        return info.get('title') or 'Playlist', entries
+
     """
         Extracts and processes audio information from a YouTube video URL.
 
+        Results are served from the shared extraction cache while their stream
+        URLs are still valid.
+
         Args:
             url (str): The URL of the YouTube video.
 
@@ -37,28 +207,53 @@ class YTDLHelper:
             dict | None: A dictionary containing extracted info, or None if extraction fails.
     """
     @staticmethod
-    async def extract_info(url):        
+    async def extract_info(url):
+        cached = await YTDLHelper.cache.get(url)
+        if cached:
+            CACHE_HITS.inc()
+            logger.debug(f"Extraction cache hit: {url}")
+            return cached.info
+
         try:
-            with YoutubeDL(YDL_OPTIONS) as ydl:
-                # Run extraction in a separate thread to avoid blocking the event loop
-                info = await asyncio.to_thread(
-                    ydl.extract_info, 
-                    url, 
-                    download=False  
+            # Run extraction on the dedicated worker pool to avoid blocking the event loop
+            with EXTRACTION_SECONDS.time(kind='audio'):
+                info = await asyncio.wait_for(
+                    YTDLHelper.pool.extract(url, YDL_OPTIONS, profile='audio'),
+                    timeout=EXTRACT_TIMEOUT
                 )
-                
-                logger.debug(f"Extracted Info: {info}")
-                
-                # If the extracted info is a playlist, return None (not supported in this version)
-                if info.get('_type') == 'playlist':
-                    logger.warning("Playlists are not supported.")
-                    return None                    
-                
-                if not info or 'url' not in info:
-                    logger.error("No valid URL found in extracted info.")
-                    return None
-                    
-                return info
+
+            logger.debug(f"Extracted Info: {info}")
+
+            # If the extracted info is a playlist, return None (not supported in this version)
+            if info and info.get('_type') == 'playlist':
+                logger.warning("Playlists are not supported.")
+                return None
+
+            if not info or 'url' not in info:
+                logger.error("No valid URL found in extracted info.")
+                return None
+
+            audio_format = YTDLHelper.select_audio_format(info)
+            info = YTDLHelper.trim_info(info, audio_format)
+            await YTDLHelper.cache.set(url, info, audio_format)
+            return info
+        except asyncio.TimeoutError:
+            EXTRACTION_FAILURES.inc(kind='audio', reason='timeout')
+            logger.warning(f"YTDL extraction timed out after {EXTRACT_TIMEOUT}s: {url}")
+            return None
+        except ExtractionQueueFull as e:
+            EXTRACTION_FAILURES.inc(kind='audio', reason='rejected')
+            logger.warning(f"YTDL queue full, rejecting {url}: {e}")
+            return None
         except Exception as e:
+            EXTRACTION_FAILURES.inc(kind='audio', reason='error')
             logger.error(f"YTDL Error: {str(e)}", exc_info=True) 
-            return None
\ No newline at end of file
+            return None
+
+    """Loads yt-dlp and its extractors on the worker pool before the first !play"""
+    @staticmethod
+    async def warm_up():
+        await YTDLHelper.pool.warm_up({'audio': YDL_OPTIONS, 'playlist': PLAYLIST_OPTIONS})
+
+
+metrics.gauge('ytdl_pending_extractions', "Extractions queued or running").set_function(lambda: YTDLHelper.pool.pending)